@@ -0,0 +1,188 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+import cv2
+
+from calculations import analyse_video, analyse_tracks
+from detection import DetectionProfile
+from detectioncache import DetectionCache
+from instrumentation import Profiler, enable_profiling, disable_profiling
+
+
+RESULT_FIELDS = ['clip', 'track', 'status', 'projectile_type', 'initial_angle', 'initial_velocity',
+                 'horizontal_distance', 'time_of_flight', 'error']
+
+# Detection profile shared by every clip a worker analyses, set once when the worker starts
+# (unpickling a profile rebuilds its lookup table, which is too slow to repeat for every clip)
+_worker_profile = None
+
+
+def find_clips(sources, extension='.mov'):
+    # Expands each source (a directory, a glob pattern or a single file) into a sorted list of clips
+    clips = []
+    for source in sources:
+        if os.path.isdir(source):
+            matches = glob.glob(os.path.join(source, f'*{extension}'))
+        else:
+            matches = glob.glob(source)
+        clips.extend(sorted(matches))
+
+    # Removes duplicates while keeping the original order
+    return list(dict.fromkeys(clips))
+
+
+def init_worker(profile=None):
+    global _worker_profile
+    # Each process analyses a whole clip, so OpenCV's own thread pool would only oversubscribe the cores
+    cv2.setNumThreads(1)
+    _worker_profile = profile
+
+
+def analyse_clip(job):
+    # Analyses a single clip and returns its records, plus the stage timings if profiling is on
+    clip, ball_diameter, tracking, cache_settings, timed, multi, profiling = job
+    profiler = enable_profiling() if profiling else None
+    try:
+        records = analyse_clip_records(clip, ball_diameter, tracking, cache_settings, timed, _worker_profile,
+                                       multi)
+    finally:
+        disable_profiling()
+
+    return records, profiler.get_state() if profiler is not None else None
+
+
+def analyse_clip_records(clip, ball_diameter, tracking, cache_settings, timed, profile, multi):
+    # Analyses a single clip and always returns at least one record, even if the analysis failed
+    # With multi set, there is one record for each ball tracked in the clip
+    record = {'clip': clip}
+    try:
+        cache = DetectionCache(*cache_settings) if cache_settings is not None else None
+        if multi:
+            tracks = analyse_tracks(clip, ball_diameter, cache=cache, timed=timed, profile=profile)
+            if len(tracks) == 0:
+                raise ValueError('No moving projectile detected.')
+            return [{'clip': clip, 'track': track_id, **results, 'status': 'ok'}
+                    for track_id, results in tracks.items()]
+
+        record.update(analyse_video(clip, ball_diameter, tracking=tracking, cache=cache, timed=timed,
+                                    profile=profile))
+        record['status'] = 'ok'
+    except Exception as error:
+        record['status'] = 'error'
+        record['error'] = f'{type(error).__name__}: {error}'
+
+    return [record]
+
+
+def run_batch(clips, ball_diameter, workers=None, chunksize=1, tracking=False, cache_settings=None,
+              timed=False, profile=None, multi=False, profiler=None):
+    # Yields one record per clip as soon as it has been analysed (not necessarily in input order)
+    # cache_settings is a (directory, max_bytes) pair for a DetectionCache shared by every worker
+    # If a Profiler is given, the stage timings from every worker are merged into it
+    profiling = profiler is not None
+    jobs = [(clip, ball_diameter, tracking, cache_settings, timed, multi, profiling) for clip in clips]
+    # No point starting more processes than there are clips
+    workers = min(workers or os.cpu_count(), len(jobs))
+    # The profile goes to each worker once rather than with every job
+    with Pool(processes=workers, initializer=init_worker, initargs=(profile,)) as pool:
+        for records, timings in pool.imap_unordered(analyse_clip, jobs, chunksize):
+            if profiling:
+                profiler.merge(timings)
+            yield from records
+
+
+def write_records(records, output, output_format):
+    # Streams the records to the output, flushing after each one so progress is visible straight away
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            output.flush()
+    else:
+        # JSON lines: one JSON object per clip
+        for record in records:
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Analyse many projectile videos in parallel without any windows or prompts.')
+    parser.add_argument('sources', nargs='+',
+                        help='video files, directories or glob patterns (e.g. videos or "videos/*.mov")')
+    parser.add_argument('-d', '--diameter', type=float, required=True,
+                        help='real-world diameter of the ball in metres')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: number of cores)')
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+                        help='output format (default: json lines)')
+    parser.add_argument('-o', '--output', help='file to write the records to (default: standard output)')
+    parser.add_argument('--tracking', action='store_true',
+                        help='only search around the ball once it has been found (faster on large frames)')
+    parser.add_argument('--multi', action='store_true',
+                        help='track every moving ball separately and write one record per ball')
+    parser.add_argument('--timed', action='store_true',
+                        help='fit x(t) and y(t) using the frame times instead of fitting y(x)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='JSON detection profile with the ball colour bounds, kernel size and minimum radius')
+    parser.add_argument('--cache', metavar='DIRECTORY',
+                        help='reuse detections stored in this directory from earlier runs')
+    parser.add_argument('--cache-size', type=float, default=1024,
+                        help='maximum size of the detection cache in MB (default: 1024)')
+    parser.add_argument('--timings', metavar='FILE',
+                        help='write per-stage timing statistics and histograms to this JSON file')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write every timed stage to this file in the Chrome trace format '
+                             '(open it in chrome://tracing or ui.perfetto.dev)')
+    parser.add_argument('--extension', default='.mov',
+                        help='file extension to look for in directories (default: .mov)')
+    args = parser.parse_args(argv)
+
+    if args.diameter <= 0:
+        parser.error('the diameter of the ball must be a positive value')
+
+    if args.multi and args.tracking:
+        parser.error('--tracking follows a single ball, so it cannot be combined with --multi')
+
+    clips = find_clips(args.sources, args.extension)
+    if len(clips) == 0:
+        parser.error('no video files found')
+
+    profile = None
+    if args.profile is not None:
+        try:
+            profile = DetectionProfile.load(args.profile)
+        except (OSError, ValueError, TypeError) as error:
+            parser.error(f'could not load the detection profile: {error}')
+
+    cache_settings = None
+    if args.cache is not None:
+        cache_settings = (args.cache, int(args.cache_size * 1024 ** 2))
+
+    profiler = Profiler() if args.timings is not None or args.trace is not None else None
+    records = run_batch(clips, args.diameter, args.workers, tracking=args.tracking,
+                        cache_settings=cache_settings, timed=args.timed, profile=profile,
+                        multi=args.multi, profiler=profiler)
+
+    if args.output is None:
+        write_records(records, sys.stdout, args.format)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            write_records(records, output, args.format)
+
+    if args.timings is not None:
+        profiler.save_json(args.timings)
+    if args.trace is not None:
+        profiler.save_trace(args.trace)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,433 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from calculations import ProjectileMotion
+from detection import DetectionProfile
+from instrumentation import Profiler, enable_profiling, disable_profiling, stage
+from mediahandling import Video
+
+# Only available on Unix, so peak resident memory is not reported on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Colour of the synthetic ball, well inside the default detection profile's HSV bounds
+BALL_COLOUR = (40, 200, 60)
+
+# Largest errors allowed before a clip counts as a failure
+# The fits are checked with the conversion ratio worked out from the radius the ball was drawn with,
+# so a bias in the measured radius cannot hide (or be hidden by) an error in the fitting
+ANGLE_TOLERANCE = 0.5
+VELOCITY_TOLERANCE = 0.01
+RANGE_TOLERANCE = 0.02
+# The measured radius is checked on its own, relative to the drawn radius
+# On the synthetic clips it is currently measured about 2 px large, as the compression blurs the edge of
+# the ball, which is up to 7% of the smallest (31 px) balls the clips draw
+RADIUS_TOLERANCE = 0.07
+# The results the pipeline reports use the measured radius, so they can be off by as much as the
+# radius allows on top of the fit's own error (the range depends on the square of the conversion ratio)
+REPORTED_VELOCITY_TOLERANCE = VELOCITY_TOLERANCE + RADIUS_TOLERANCE
+REPORTED_RANGE_TOLERANCE = RANGE_TOLERANCE + 2 * RADIUS_TOLERANCE
+
+# Longest a fresh 'import batch' may take, in seconds (about 0.2 s once matplotlib, tkinter and PIL
+# were only imported where they are used, up from 0.5 s before)
+IMPORT_TIME_LIMIT = 0.3
+
+# Both ways of fitting the trajectory (see ProjectileMotion)
+FIT_MODES = {'timed': True, 'curve': False}
+
+# Seconds the ball is held still before each clip is thrown, whether it is launched from the left edge
+# of the frame, and its frame rate (None for the rate the benchmark was run at)
+# The y(x) fit gives the slope at the left edge of the frame, which is only the launch angle for balls
+# launched from there, while the timed fit needs to see the launch, which is half out of frame there,
+# so each fit is only checked on the clips it can measure
+# The high-speed hold checks that finding the launch still works when the ball moves little per frame
+CLIP_VARIANTS = [(0.0, False, None), (0.5, False, None), (0.0, True, None), (0.5, True, None), (0.5, False, 240)]
+
+
+class SyntheticClip:
+    # A video of a green ball following a known parabola, for measuring speed and accuracy
+    # The camera is side-on and the whole flight, from launch back down to launch height, is in shot
+    def __init__(self, angle, velocity, ball_diameter=0.22, resolution=(1280, 720), fps=60, noise=0.0,
+                 clutter=0, g=9.81, hold=0.0, from_edge=False, seed=None):
+        self.angle = angle
+        self.velocity = velocity
+        self.ball_diameter = ball_diameter
+        self.resolution = resolution
+        self.fps = fps
+        # Standard deviation of the Gaussian noise added to every pixel
+        self.noise = noise
+        # Number of distracting shapes in the background, one in three of them ball-coloured
+        self.clutter = clutter
+        self.g = g
+        # Seconds the ball is held still at the launch point before it is thrown
+        self.hold = hold
+        # Launches from the left edge of the frame instead of centring the flight
+        self.from_edge = from_edge
+        self.rng = np.random.default_rng(seed)
+
+    def get_ground_truth(self):
+        # Launch quantities and the range and time of flight back to launch height
+        theta = math.radians(self.angle)
+        time_of_flight = 2 * self.velocity * math.sin(theta) / self.g
+        return {
+            'initial_angle': self.angle,
+            'initial_velocity': self.velocity,
+            'horizontal_distance': self.velocity * math.cos(theta) * time_of_flight,
+            'time_of_flight': time_of_flight,
+        }
+
+    def get_scale(self):
+        # Pixels per metre that fit the whole flight (and the ball) into 80% of the frame
+        # Rounded so the ball is drawn with a whole number of pixels as its radius, which makes the
+        # drawn ball give exactly the scale the positions were drawn at
+        truth = self.get_ground_truth()
+        theta = math.radians(self.angle)
+        max_height = (self.velocity * math.sin(theta)) ** 2 / (2 * self.g)
+        width, height = self.resolution
+        scale = 0.8 * min(width / (truth['horizontal_distance'] + self.ball_diameter),
+                          height / (max_height + self.ball_diameter))
+        return max(round(scale * self.ball_diameter / 2), 1) * 2 / self.ball_diameter
+
+    def get_radius(self):
+        # Radius of the drawn ball in pixels
+        return int(round(self.get_scale() * self.ball_diameter / 2))
+
+    def get_positions(self):
+        # Centre of the ball in pixels in every frame, from the start of the hold until it is back at
+        # launch height, with the flight centred in the frame (or launched from its left edge)
+        truth = self.get_ground_truth()
+        theta = math.radians(self.angle)
+        scale = self.get_scale()
+        t = np.arange(0, truth['time_of_flight'], 1 / self.fps)
+        x = self.velocity * math.cos(theta) * t
+        y = self.velocity * math.sin(theta) * t - 0.5 * self.g * t ** 2
+
+        width, height = self.resolution
+        left = 0 if self.from_edge else (width - scale * truth['horizontal_distance']) / 2
+        bottom = (height + scale * y.max()) / 2
+        positions = np.column_stack((left + scale * x, bottom - scale * y))
+
+        held_frames = int(round(self.hold * self.fps))
+        return np.concatenate((np.repeat(positions[:1], held_frames, axis=0), positions))
+
+    def get_background(self):
+        # Grey background with some darker, non-ball-coloured shapes and static ball-coloured objects
+        width, height = self.resolution
+        background = np.full((height, width, 3), 90, np.uint8)
+        radius = self.get_radius()
+        for i in range(self.clutter):
+            centre = (int(self.rng.integers(0, width)), int(self.rng.integers(0, height // 2)))
+            colour = BALL_COLOUR if i % 3 == 2 else tuple(int(c) for c in self.rng.integers(0, 80, 3))
+            cv2.circle(background, centre, int(radius * self.rng.uniform(0.5, 1.5)), colour, cv2.FILLED)
+
+        return background
+
+    def write(self, file_name):
+        # Writes the clip as Motion JPEG and returns the number of frames
+        background = self.get_background()
+        radius = self.get_radius()
+        writer = cv2.VideoWriter(file_name, cv2.VideoWriter_fourcc(*'MJPG'), self.fps, self.resolution)
+        if not writer.isOpened():
+            raise RuntimeError(f'Could not write the video file {file_name}.')
+
+        positions = self.get_positions()
+        for x, y in positions:
+            frame = background.copy()
+            cv2.circle(frame, (int(round(x)), int(round(y))), radius, BALL_COLOUR, cv2.FILLED, cv2.LINE_AA)
+            if self.noise > 0:
+                frame = np.clip(frame + self.rng.normal(0, self.noise, frame.shape), 0, 255).astype(np.uint8)
+            writer.write(frame)
+
+        writer.release()
+        return len(positions)
+
+
+def get_errors(results, truth):
+    # Absolute error in degrees for the angle, relative errors for everything else
+    return {
+        'initial_angle': abs(results['initial_angle'] - truth['initial_angle']),
+        'initial_velocity': abs(results['initial_velocity'] / truth['initial_velocity'] - 1),
+        'horizontal_distance': abs(results['horizontal_distance'] / truth['horizontal_distance'] - 1),
+    }
+
+
+def is_accurate(errors, velocity_tolerance=VELOCITY_TOLERANCE, range_tolerance=RANGE_TOLERANCE):
+    return (errors['initial_angle'] <= ANGLE_TOLERANCE and errors['initial_velocity'] <= velocity_tolerance
+            and errors['horizontal_distance'] <= range_tolerance)
+
+
+def analyse_clip(file_name, clip, workers=1, tracking=False, profile=None):
+    # Detects the ball once, then fits the trajectory both ways, with the conversion ratio from the
+    # measured radius (as the pipeline reports it) and with the ratio from the drawn radius
+    with stage('detect_clip'):
+        video = Video(file_name, display=False, workers=workers, tracking=tracking, profile=profile)
+
+    analysis = {}
+    with stage('analyse_clip'):
+        for mode, timed in FIT_MODES.items():
+            motion = ProjectileMotion(video, clip.ball_diameter, timed)
+            # A ball diameter scaled by the radius bias gives the same conversion ratio as the drawn radius
+            calibrated_diameter = clip.ball_diameter * motion.pixel_diameter / (2 * clip.get_radius())
+            analysis[mode] = {
+                'results': motion.get_results(),
+                'calibrated_results': ProjectileMotion(video, calibrated_diameter, timed).get_results(),
+                'radius_error_px': motion.pixel_diameter / 2 - clip.get_radius(),
+            }
+
+    return analysis
+
+
+def benchmark_clip(file_name, clip, num_frames, workers=1, tracking=False, profile=None):
+    # Runs the whole detection, cleaning and fitting pipeline on one clip and checks it against the truth
+    profiler = enable_profiling(Profiler())
+    start = time.perf_counter()
+    try:
+        analysis = analyse_clip(file_name, clip, workers, tracking, profile)
+        error = None
+    except Exception as exception:
+        analysis = None
+        error = f'{type(exception).__name__}: {exception}'
+    elapsed = time.perf_counter() - start
+    disable_profiling()
+
+    # Memory is measured in a second run, as tracing every allocation slows the pipeline down
+    peak_memory = 0
+    if error is None:
+        tracemalloc.start()
+        analyse_clip(file_name, clip, workers, tracking, profile)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stages = profiler.get_summary()['stages']
+    record = {
+        'frames': num_frames,
+        'seconds': elapsed,
+        'frames_per_second': num_frames / elapsed,
+        'peak_traced_mb': peak_memory / 1024 ** 2,
+        'stage_ms': {name: stage['total_ms'] for name, stage in stages.items()},
+        'fps': clip.fps,
+        'hold': clip.hold,
+        'from_edge': clip.from_edge,
+        'truth': clip.get_ground_truth(),
+        'error': error,
+        'accurate': error is None,
+    }
+    if analysis is None:
+        return record
+
+    record['radius_error_px'] = analysis['timed']['radius_error_px']
+    record['radius_error'] = record['radius_error_px'] / clip.get_radius()
+    record['accurate'] = abs(record['radius_error']) <= RADIUS_TOLERANCE
+    for mode, fit in analysis.items():
+        fit['errors'] = get_errors(fit['results'], record['truth'])
+        fit['calibrated_errors'] = get_errors(fit['calibrated_results'], record['truth'])
+        fit['gated'] = (mode == 'curve') == clip.from_edge
+        # Both the fit on its own and the results users see have to be accurate
+        fit['accurate'] = (is_accurate(fit['calibrated_errors'])
+                           and is_accurate(fit['errors'], REPORTED_VELOCITY_TOLERANCE, REPORTED_RANGE_TOLERANCE))
+        if fit['gated'] and not fit['accurate']:
+            record['accurate'] = False
+        del fit['radius_error_px']
+    record['fits'] = analysis
+
+    return record
+
+
+def get_commit():
+    # The current git commit, so results can be compared across commits
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_import_seconds(module='batch', runs=3):
+    # Time taken to import the module in a fresh interpreter, as measured by python -X importtime
+    # The fastest of several runs, so a slow disk or a stale bytecode cache on the first run is ignored
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        # Lines look like 'import time: self [us] | cumulative | module', with the module itself last
+        for line in result.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module:
+                timings.append(int(fields[1]) / 1e6)
+
+    return min(timings)
+
+
+def get_max_rss_mb():
+    # Peak resident memory of the whole process so far, or None where it cannot be measured
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes everywhere else
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024
+
+
+def run_benchmark(num_clips=5, resolution=(1280, 720), fps=60, noise=0.0, clutter=0, seed=0, workers=1,
+                  tracking=False, downscale=1, directory=None):
+    # Generates the clips, analyses each one in turn and returns a summary with one record per clip
+    # The clips cycle through CLIP_VARIANTS, so both fits are checked on holds, edge launches and
+    # high-speed footage
+    profile = DetectionProfile(downscale=downscale)
+    rng = np.random.default_rng(seed)
+    clips = []
+    for i in range(num_clips):
+        hold, from_edge, clip_fps = CLIP_VARIANTS[i % len(CLIP_VARIANTS)]
+        clips.append(SyntheticClip(rng.uniform(20, 60), rng.uniform(3, 6), resolution=resolution,
+                                   fps=fps if clip_fps is None else clip_fps,
+                                   noise=noise, clutter=clutter, hold=hold, from_edge=from_edge,
+                                   seed=int(rng.integers(2 ** 31))))
+
+    records = []
+    with tempfile.TemporaryDirectory(dir=directory) as clip_directory:
+        file_names = [os.path.join(clip_directory, f'clip{i}.avi') for i in range(num_clips)]
+        frame_counts = [clip.write(file_name) for clip, file_name in zip(clips, file_names)]
+
+        # Untimed warm-up run, so one-off start-up costs are not counted against the first clip
+        benchmark_clip(file_names[0], clips[0], frame_counts[0], workers, tracking, profile)
+
+        for clip, file_name, num_frames in zip(clips, file_names, frame_counts):
+            records.append(benchmark_clip(file_name, clip, num_frames, workers, tracking, profile))
+
+    total_seconds = sum(record['seconds'] for record in records)
+    total_frames = sum(record['frames'] for record in records)
+    return {
+        'commit': get_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {'clips': num_clips, 'resolution': list(resolution), 'fps': fps, 'noise': noise,
+                     'clutter': clutter, 'seed': seed, 'workers': workers, 'tracking': tracking,
+                     'downscale': downscale},
+        'frames_per_second': total_frames / total_seconds,
+        'clips_per_second': num_clips / total_seconds,
+        'peak_traced_mb': max(record['peak_traced_mb'] for record in records),
+        'max_rss_mb': get_max_rss_mb(),
+        'import_seconds': get_import_seconds(),
+        'accurate_clips': sum(record['accurate'] for record in records),
+        'clips': records,
+    }
+
+
+def find_previous(history_file, settings):
+    # The most recent earlier run with the same settings, or None
+    if history_file is None or not os.path.exists(history_file):
+        return None
+
+    previous = None
+    with open(history_file) as history:
+        for line in history:
+            summary = json.loads(line)
+            if summary['settings'] == settings:
+                previous = summary
+
+    return previous
+
+
+def print_summary(summary, previous=None):
+    def change(key):
+        # Relative change against the previous run with the same settings
+        if previous is None or key not in previous:
+            return ''
+        return f' ({summary[key] / previous[key] - 1:+.1%} vs {previous["commit"]})'
+
+    print(f'Commit {summary["commit"]}: {summary["settings"]}')
+    for i, record in enumerate(summary['clips']):
+        if record['error'] is not None:
+            print(f'  clip {i}: FAILED ({record["error"]})')
+            continue
+        launch = 'edge' if record['from_edge'] else 'centred'
+        print(f'  clip {i}: {record["frames"]} frames ({launch}, {record["hold"]:.1f} s hold, '
+              f'{record["fps"]:g} fps), {record["frames_per_second"]:.1f} frames/s, '
+              f'radius error {record["radius_error_px"]:+.2f} px ({record["radius_error"]:+.1%})'
+              f'{"" if abs(record["radius_error"]) <= RADIUS_TOLERANCE else "  INACCURATE"}')
+        for mode, fit in record['fits'].items():
+            # Errors with the drawn radius's conversion ratio, then as reported with the measured radius
+            errors, reported = fit['calibrated_errors'], fit['errors']
+            if not fit['gated']:
+                verdict = '  (not checked)'
+            else:
+                verdict = '' if fit['accurate'] else '  INACCURATE'
+            print(f'    {mode:>5}: angle error {errors["initial_angle"]:.2f} deg, '
+                  f'velocity error {errors["initial_velocity"]:.2%} ({reported["initial_velocity"]:.2%} reported), '
+                  f'range error {errors["horizontal_distance"]:.2%} '
+                  f'({reported["horizontal_distance"]:.2%} reported){verdict}')
+    print(f'Throughput: {summary["frames_per_second"]:.1f} frames/s{change("frames_per_second")}, '
+          f'{summary["clips_per_second"]:.2f} clips/s{change("clips_per_second")}')
+    resident = '' if summary['max_rss_mb'] is None else f', {summary["max_rss_mb"]:.1f} MB resident'
+    print(f'Peak memory: {summary["peak_traced_mb"]:.1f} MB traced{change("peak_traced_mb")}{resident}')
+    print(f'Import time: {summary["import_seconds"] * 1000:.0f} ms{change("import_seconds")}'
+          f'{"" if summary["import_seconds"] <= IMPORT_TIME_LIMIT else "  TOO SLOW"}')
+    print(f'Accurate clips: {summary["accurate_clips"]}/{len(summary["clips"])}')
+
+
+def parse_resolution(value):
+    try:
+        width, height = (int(n) for n in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('resolution must look like 1280x720')
+    return width, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time the detection, cleaning and fitting pipeline on synthetic projectile videos '
+                    'and check its results against the known trajectories.')
+    parser.add_argument('-n', '--clips', type=int, default=5, help='number of clips to generate (default: 5)')
+    parser.add_argument('-r', '--resolution', type=parse_resolution, default=(1280, 720),
+                        help='frame size as WIDTHxHEIGHT (default: 1280x720)')
+    parser.add_argument('--fps', type=float, default=60, help='frame rate of the clips (default: 60)')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='standard deviation of the pixel noise added to every frame (default: 0)')
+    parser.add_argument('--clutter', type=int, default=0,
+                        help='number of distracting shapes in the background (default: 0)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random trajectories (default: 0)')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='detection threads per clip (default: 1)')
+    parser.add_argument('--tracking', action='store_true', help='only search around the ball once found')
+    parser.add_argument('--downscale', type=int, default=1,
+                        help='search for the ball in frames shrunk by this factor, then refine at full resolution')
+    parser.add_argument('--history', metavar='FILE',
+                        help='append the results to this JSON lines file and compare with the last matching run')
+    parser.add_argument('--details', metavar='FILE', help='write the full results, including each stage, to this file')
+    args = parser.parse_args(argv)
+
+    if args.clips < 1:
+        parser.error('at least one clip is needed')
+    if args.downscale < 1:
+        parser.error('the downscale factor must be at least 1')
+
+    summary = run_benchmark(args.clips, args.resolution, args.fps, args.noise, args.clutter, args.seed,
+                            args.workers, args.tracking, args.downscale)
+    print_summary(summary, find_previous(args.history, summary['settings']))
+
+    if args.details is not None:
+        with open(args.details, 'w') as details:
+            json.dump(summary, details, indent=2)
+    if args.history is not None:
+        # Only the totals are kept in the history, one line per run
+        totals = {key: value for key, value in summary.items() if key != 'clips'}
+        with open(args.history, 'a') as history:
+            history.write(json.dumps(totals) + '\n')
+
+    # Fails if any clip was analysed inaccurately or the imports got too slow, so the benchmark can gate changes
+    return 0 if summary['accurate_clips'] == args.clips and summary['import_seconds'] <= IMPORT_TIME_LIMIT else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,10 @@
 import numpy as np
-from scipy.optimize import curve_fit
 import math
-
-import matplotlib.pyplot as plt
+import functools
 
 from mediahandling import *
+from drag import simulate_drag_trajectories, SPHERE_DRAG_COEFFICIENT
+from instrumentation import stage, timed_stage
 
 
 class Calculate:
@@ -13,17 +13,18 @@ class Calculate:
 
     # Removes anomalies from a list of values.
     def remove_list_anomalies(self, list_of_values):
-        # Returns an empty list if original list is empty
-        if len(list_of_values) == 0:
-            return []
+        values = np.asarray(list_of_values, dtype=np.float64)
+        # Returns an empty array if original list is empty
+        if len(values) == 0:
+            return values
         else:
             # Gets mean of values in the list
-            mean = sum(list_of_values) / len(list_of_values)
+            mean = values.mean()
             # Calculates standard deviation of the values in the list
-            std_dev = (sum((x - mean)**2 for x in list_of_values) /
-                       len(list_of_values))**0.5
+            std_dev = values.std()
             #  Removes any values that are more than self.num_stds standard deviations away from the mean.
-            return [x for x in list_of_values if abs(x - mean) < self.num_stds * std_dev]
+            # (<= keeps every value when they are all identical and the standard deviation is 0)
+            return values[np.abs(values - mean) <= self.num_stds * std_dev]
 
     def get_average(self, list_of_values):
         # Returns 0 if original list is empty
@@ -31,7 +32,7 @@ class Calculate:
             return 0
         # Returns the mean of the values in the list
         else:
-            return sum(list_of_values) / len(list_of_values)
+            return float(np.mean(list_of_values))
 
     def estimate_initial_gradient(self, xlist, ylist):
         # Calculates the gradient between the first and fifth points.
@@ -42,25 +43,81 @@ class Calculate:
         return gradient
 
     def get_curve_function_coeffs(self, degree, xlist, ylist):
-        # Converts the two lists of x and y coordinates into numpy arrays
-        x_data = np.array(xlist)
-        y_data = np.array(ylist)
+        # Return the coefficients of the polynomial curve (highest power first, as used by np.polyval)
+        coeffs, _ = self.fit_polynomial(degree, xlist, ylist)
 
-        # Define the function to fit
-        def func(x, *params):
-            return np.polyval(params, x)
-
-        # Initial guess for the parameters
-        p0 = np.ones(degree + 1)
+        return coeffs
 
-        # Perform the curve fitting
-        coeffs, _ = curve_fit(func, x_data, y_data, p0=p0)
+    @timed_stage('fit')
+    def fit_polynomial(self, degree, x, y):
+        # Fits a polynomial of the given degree by linear least squares in a single direct solve
+        # x and y can be 1D arrays (one trajectory) or 2D arrays with one trajectory per row
+        # Returns the coefficients (highest power first) and their covariance matrix
+        x_data = np.asarray(x, dtype=np.float64)
+        y_data = np.asarray(y, dtype=np.float64)
+        batched = y_data.ndim == 2
+        x_data, y_data = np.broadcast_arrays(np.atleast_2d(x_data), np.atleast_2d(y_data))
+
+        num_points = x_data.shape[-1]
+        num_coeffs = degree + 1
+        if num_points < num_coeffs:
+            raise ValueError(f'At least {num_coeffs} points are needed to fit a polynomial of degree {degree}.')
+
+        # Centres and scales x to [-1, 1] so the Vandermonde matrix stays well conditioned for pixel-sized values
+        centre = (x_data.max(axis=-1) + x_data.min(axis=-1)) / 2
+        scale = (x_data.max(axis=-1) - x_data.min(axis=-1)) / 2
+        scale[scale == 0] = 1
+        x_scaled = (x_data - centre[:, None]) / scale[:, None]
+
+        # Vandermonde matrix with increasing powers: 1, x, x^2, ...
+        vandermonde = x_scaled[..., None] ** np.arange(num_coeffs)
+
+        # QR decomposition avoids forming the normal equations, which would square the condition number
+        q, r = np.linalg.qr(vandermonde)
+        scaled_coeffs = np.linalg.solve(r, np.einsum('bnk,bn->bk', q, y_data)[..., None])[..., 0]
+
+        # Residual variance, as used by curve_fit to scale the covariance
+        residuals = y_data - np.einsum('bnk,bk->bn', vandermonde, scaled_coeffs)
+        # With no spare points the covariance cannot be estimated, so it is reported as infinite like curve_fit does
+        dof = num_points - num_coeffs
+        variance = np.sum(residuals ** 2, axis=-1) / max(dof, 1)
+        r_inv = np.linalg.inv(r)
+        scaled_cov = variance[:, None, None] * (r_inv @ np.swapaxes(r_inv, -1, -2))
+
+        # Converts the coefficients back from scaled x to the original x using the binomial expansion
+        # of ((x - centre) / scale)^k, i.e. transform[j, k] = C(k, j) * (-centre)^(k - j) / scale^k
+        transform = np.zeros((len(y_data), num_coeffs, num_coeffs))
+        for k in range(num_coeffs):
+            for j in range(k + 1):
+                transform[:, j, k] = math.comb(k, j) * (-centre) ** (k - j) / scale ** k
+        coeffs = np.einsum('bjk,bk->bj', transform, scaled_coeffs)
+        cov = transform @ scaled_cov @ np.swapaxes(transform, -1, -2)
+        if dof <= 0:
+            cov = np.full_like(cov, np.inf)
+
+        # Reverses the order so the highest power comes first
+        coeffs = coeffs[:, ::-1]
+        cov = cov[:, ::-1, ::-1]
+
+        if batched:
+            return coeffs, cov
+        return coeffs[0], cov[0]
+
+    def get_pixel_to_real_world_conversion_ratio(self, pixel_units, real_world_objects, real_units=None):
+
+        # Uses the measurement supplied by the caller instead of prompting for one
+        if real_units is not None:
+            if real_units <= 0:
+                raise ValueError(f'The {real_world_objects} must be a positive value.')
+        else:
+            real_units = self.get_real_world_measurement(real_world_objects)
 
-        # Return the coefficients of the polynomial curve
-        return coeffs
+        # Calculates the conversion_ratio
+        conversion_ratio = real_units / pixel_units
 
-    def get_pixel_to_real_world_conversion_ratio(self, pixel_units, real_world_objects):
+        return conversion_ratio
 
+    def get_real_world_measurement(self, real_world_objects):
         Valid = False
         while not Valid:
             try:
@@ -80,10 +137,7 @@ class Calculate:
                 # Displays an error message if a non-numerical response is given
                 print('Please enter a valid float/integer.')
 
-        # Calculates the conversion_ratio
-        conversion_ratio = real_units / pixel_units
-
-        return conversion_ratio
+        return real_units
 
     def convert_pixel_units_to_real_world_units(self, pixel_units, conversion_ratio):
         # Converts pixel units to real-world units
@@ -108,77 +162,119 @@ class Coordinates:
         opencv_coords = self.video.get_centroid_coords()
         return opencv_coords
 
+    def as_coordinate_array(self, coordinates):
+        # Converts a list of (x, y) tuples (or an existing array) into one contiguous (n, 2) float array
+        # Arrays that are already in this form are used as they are, without copying
+        return np.ascontiguousarray(coordinates, dtype=np.float64).reshape(-1, 2)
+
     def get_matplotlib_coordinates(self, opencv_coords):
+        coords = self.as_coordinate_array(opencv_coords)
         # Determines maximum y-value from the list of opencv coordinates
-        height = max(opencv_coords, key=lambda x: x[1])[1]
+        height = coords[:, 1].max()
         # Subtracts each y-value from the maximum y-value to obtain matplotlib y-coordinates
-        matplotlib_coords = [(x, height - y) for x, y in opencv_coords]
-        # Returns resulting coordinates as a list of tuples
+        matplotlib_coords = coords.copy()
+        matplotlib_coords[:, 1] = height - coords[:, 1]
+        # Returns resulting coordinates as an (n, 2) array
         return matplotlib_coords
 
     def remove_outlier_coords(self, coordinates):
-        # Extract the x and y coordinates into separate lists
-        xvalues, yvalues = self.split_coords(coordinates)
+        coords = self.as_coordinate_array(coordinates)
+
+        # Returns an (n, 2) array of coordinates with no outliers
+        return coords[self.get_outlier_coords_mask(coords)]
+
+    def get_outlier_coords_mask(self, coordinates):
+        # Returns a boolean array that is True for every coordinate that is not an outlier
+        coords = self.as_coordinate_array(coordinates)
 
         # Calculate the median for the x and y values
-        medianx = np.median(xvalues)
-        mediany = np.median(yvalues)
+        medians = np.median(coords, axis=0)
 
         # Calculate the median absolute deviation (MAD) for the x and y values
-        madx = np.median(np.abs(xvalues - medianx))
-        mady = np.median(np.abs(yvalues - mediany))
+        deviations = np.abs(coords - medians)
+        mads = np.median(deviations, axis=0)
 
-        # Calculate the upper and lower bounds for the x and y values using the self.threshold value
-        upperx = medianx + self.threshold * madx
-        lowerx = medianx - self.threshold * madx
-        uppery = mediany + self.threshold * mady
-        lowery = mediany - self.threshold * mady
+        # Keep only the coordinates whose x and y values are both within self.threshold MADs of the median
+        keep = np.all(deviations <= self.threshold * mads, axis=1)
 
-        # Create a new list of coordinates without outliers
-        filtered_coords = []
-        for coord in coordinates:
-            x, y = coord
-            if (lowerx <= x <= upperx) and (lowery <= y <= uppery):
-                filtered_coords.append(coord)
-
-        # Returns a list of coordinates stored in the form of tuples with no outliers
-        return filtered_coords
+        return keep
 
     def remove_close_coords(self, coordinates):
-        result = []
-        for i in range(len(coordinates)):
-            too_close = False
-            for j in range(i+1, len(coordinates)):
-                # Uses pythogoras theorem to calculate the distance between two points
-                dist = math.sqrt(
-                    (coordinates[i][0]-coordinates[j][0])**2 + (coordinates[i][1]-coordinates[j][1])**2)
-                if dist < self.threshold:
-                    too_close = True
-                    break
-            if not too_close:
-                result.append(coordinates[i])
-
-        return result
-
-    def split_coords(self, tuple_list):
-        # Splits a list of tuples into two separate lists
-        xlist = [x for x, y in tuple_list]
-        ylist = [y for x, y in tuple_list]
-
-        return xlist, ylist
+        # Removes every coordinate that has a later coordinate closer than self.threshold to it
+        coords = self.as_coordinate_array(coordinates)
+
+        return coords[self.get_close_coords_mask(coords)]
+
+    def get_close_coords_mask(self, coordinates):
+        # Returns a boolean array that is False for every coordinate with a later coordinate closer than self.threshold
+        coords = self.as_coordinate_array(coordinates)
+        n = len(coords)
+        if n < 2 or self.threshold <= 0:
+            return np.ones(n, dtype=bool)
+
+        # Hashes the coordinates into a grid whose cells are small enough that any two coordinates
+        # in the same cell are closer than self.threshold (the cell diagonal is just under the threshold)
+        cell_size = self.threshold / math.sqrt(2) * (1 - 1e-9)
+        cells = np.floor(coords / cell_size).astype(np.int64)
+        # Offsets the cells so that neighbouring cells two away can never have negative indices
+        cells -= cells.min(axis=0) - 2
+        rows = cells[:, 1].max() + 3
+        keys = cells[:, 0] * rows + cells[:, 1]
+
+        # Sorting by cell keeps coordinates in the same cell together, in their original order
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        # Only the last coordinate in each cell can survive, as every other one has a later coordinate nearby
+        last_in_cell = np.append(sorted_keys[1:] != sorted_keys[:-1], True)
+        candidates = order[last_in_cell]
+        too_close = np.ones(n, dtype=bool)
+        too_close[candidates] = False
+
+        # Compares each remaining coordinate with every coordinate in the cells around it
+        # (a coordinate closer than the threshold is at most two cells away)
+        # Cells in the same column have consecutive keys, so each column of five cells is one range of sorted_keys
+        threshold_squared = self.threshold ** 2
+        for dx in range(-2, 3):
+            column_keys = keys[candidates] + dx * rows
+            starts = np.searchsorted(sorted_keys, column_keys - 2, side='left')
+            counts = np.searchsorted(sorted_keys, column_keys + 2, side='right') - starts
+            total = counts.sum()
+            if total == 0:
+                continue
+
+            # Expands every (candidate, neighbour) pair without a Python loop
+            first = np.repeat(candidates, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = order[np.repeat(starts, counts) + offsets]
+
+            # Only later coordinates count, as in the original pairwise comparison
+            later = second > first
+            distances_squared = np.sum((coords[first] - coords[second]) ** 2, axis=1)
+            too_close[first[later & (distances_squared < threshold_squared)]] = True
+
+        return ~too_close
+
+    def get_clean_coordinate_indices(self, coordinates):
+        # Indices of the coordinates left after removing close coordinates and then outliers,
+        # so other per-detection values (such as timestamps) can be matched to the cleaned coordinates
+        coords = self.as_coordinate_array(coordinates)
+        indices = np.flatnonzero(self.get_close_coords_mask(coords))
+
+        return indices[self.get_outlier_coords_mask(coords[indices])]
+
+    def split_coords(self, coordinates):
+        # Splits an (n, 2) array of coordinates into separate x and y arrays (views, not copies)
+        coords = self.as_coordinate_array(coordinates)
+
+        return coords[:, 0], coords[:, 1]
 
     def scale_coords(self, xlist, ylist, conversion_ratio):
-        xarr = np.array(xlist)
-        yarr = np.array(ylist)
-
         # Matrix scalar multiplication to scale elements in the array by conversion_ratio
-        scaledxarr = xarr * conversion_ratio
-        scaledyarr = yarr * conversion_ratio
+        scaledxarr = np.asarray(xlist, dtype=np.float64) * conversion_ratio
+        scaledyarr = np.asarray(ylist, dtype=np.float64) * conversion_ratio
 
-        scaledxlist = list(scaledxarr)
-        scaledylist = list(scaledyarr)
-
-        return scaledxlist, scaledylist
+        return scaledxarr, scaledyarr
 
     def get_horizontal_translation_units(self, xlist):
         # Gets the first x-coordinate of the list of x-coordinates
@@ -192,25 +288,116 @@ class Coordinates:
 
         return vunit
 
+def cached_result(method):
+    # Decorator that works out a derived quantity once and then reuses it
+    # until clear_cache() is called on the object
+    @functools.wraps(method)
+    def wrapper(self):
+        if method.__name__ not in self.derived_values:
+            self.derived_values[method.__name__] = method(self)
+        return self.derived_values[method.__name__]
+
+    return wrapper
+
+
 # Multiple Inheritance
 class ProjectileMotion(Calculate, Coordinates):
-    def __init__(self):
+    def __init__(self, video=None, ball_diameter=None, timed=False, preview_fps=None):
         super().__init__()
-        self.video = Video()
+        # Derived quantities that have been worked out so far (see cached_result)
+        self.derived_values = {}
+
+        # Any object providing get_centroid_coords() and get_radius_values() can be analysed
+        if video is None:
+            # Asked for before detection so the webcam feed can show the predicted range
+            if ball_diameter is None:
+                ball_diameter = self.get_real_world_measurement('diameter of the ball')
+            video = Video(preview_fps=preview_fps, ball_diameter=ball_diameter)
+        self.video = video
 
         self.threshold = 2.5
 
+        self.pixel_diameter = self.get_pixel_diameter()
         self.conversion_ratio = self.get_pixel_to_real_world_conversion_ratio(
-            self.get_pixel_diameter(), 'diameter of the ball')
+            self.pixel_diameter, 'diameter of the ball', ball_diameter)
 
         self.hcoords, self.vcoords = self.get_scaled_coordinates()
-        self.projectile_type = self.check_projectile_type()
+
+        # Timed fitting uses the frame times to fit x(t) and y(t) instead of fitting y(x)
+        self.timed = timed
+        self.tcoords = self.get_timestamps() if timed else None
 
         self.g = 9.81
-        self.a, self.b, self.c = self.get_projectile_function_coeffs()
-        self.theta = self.estimate_initial_angle()
-        self.initial_velocity = self.estimate_initial_velocity()
-        self.hdistance_travelled = self.get_horizontal_distance_travelled()
+
+    def clear_cache(self):
+        # Forgets every derived quantity so they are recalculated from the current coordinates and g
+        self.derived_values.clear()
+
+    # Changing the coordinates or g makes every derived quantity out of date
+    @property
+    def hcoords(self):
+        return self.__hcoords
+
+    @hcoords.setter
+    def hcoords(self, value):
+        self.__hcoords = value
+        self.clear_cache()
+
+    @property
+    def vcoords(self):
+        return self.__vcoords
+
+    @vcoords.setter
+    def vcoords(self, value):
+        self.__vcoords = value
+        self.clear_cache()
+
+    @property
+    def tcoords(self):
+        return self.__tcoords
+
+    @tcoords.setter
+    def tcoords(self, value):
+        self.__tcoords = value
+        self.clear_cache()
+
+    @property
+    def g(self):
+        return self.__g
+
+    @g.setter
+    def g(self, value):
+        self.__g = value
+        self.clear_cache()
+
+    # Derived quantities, each calculated at most once per fit
+    @property
+    def projectile_type(self):
+        return self.check_projectile_type()
+
+    @property
+    def a(self):
+        return self.get_projectile_function_coeffs()[0]
+
+    @property
+    def b(self):
+        return self.get_projectile_function_coeffs()[1]
+
+    @property
+    def c(self):
+        return self.get_projectile_function_coeffs()[2]
+
+    @property
+    def theta(self):
+        return self.estimate_initial_angle()
+
+    @property
+    def initial_velocity(self):
+        return self.estimate_initial_velocity()
+
+    @property
+    def hdistance_travelled(self):
+        return self.get_horizontal_distance_travelled()
 
     def get_pixel_diameter(self):
         # Get list of radius values with anomalies removed
@@ -236,8 +423,12 @@ class ProjectileMotion(Calculate, Coordinates):
         raw_coords = self.get_matplotlib_coordinates(
             self.get_opencv_coordinates())
         # Process matplotlib coordinates by removing outliers and coordinates that are too close to each other
-        coordinates = self.remove_outlier_coords(
-            self.remove_close_coords(raw_coords))
+        # The indices of the remaining detections are kept so their timestamps can be looked up
+        with stage('clean'):
+            self.coordinate_indices = self.get_clean_coordinate_indices(raw_coords)
+        coordinates = raw_coords[self.coordinate_indices]
+        # Every detection is kept too, so the launch can be found if cleaning removed it
+        self.raw_coordinates = raw_coords
 
         # Get scaled horizontal and vertical coordinates
         hcoords, vcoords = self.split_coords(coordinates)
@@ -246,6 +437,61 @@ class ProjectileMotion(Calculate, Coordinates):
 
         return scaledhcoords, scaledvcoords
 
+    def get_timestamps(self):
+        # Times in seconds of the cleaned coordinates, measured from the launch
+        timestamps = self.video.get_timestamps()
+        if timestamps is None:
+            raise ValueError('Timed fitting needs the frame times of the detections.')
+
+        times = np.asarray(timestamps, dtype=np.float64)
+        tcoords = times[self.coordinate_indices] - times[self.coordinate_indices[0]]
+
+        return tcoords - self.get_launch_offset(times, tcoords)
+
+    def get_launch_offset(self, times, tcoords):
+        # Outlier removal trims the first few points of the flight, so the first cleaned coordinate is
+        # usually a frame or two after the launch
+        # Walks back one frame at a time from the first cleaned coordinate for as long as some detection
+        # in the frame lies on the fitted x(t) and y(t) curves, and returns how far back the launch is
+        # A ball held still before the throw is only on the curves at the moment it is released,
+        # and static objects elsewhere in the frame are never on them, so neither moves the launch
+        xcoeffs, _ = self.fit_polynomial(1, tcoords, self.hcoords)
+        ycoeffs, _ = self.fit_polynomial(2, tcoords, self.vcoords)
+
+        # A quarter of the ball's radius in metres, or half the distance the fitted ball moves between
+        # the frames if that is less, so at high frame rates the last frame of a hold is not taken as part
+        # of the flight
+        radius_tolerance = self.pixel_diameter * self.conversion_ratio / 8
+        start = times[self.coordinate_indices[0]]
+        coords = self.raw_coordinates * self.conversion_ratio
+        earlier = times < start
+
+        offset = 0.0
+        later = start
+        for frame_time in np.unique(times[earlier])[::-1]:
+            t = frame_time - start
+            in_frame = times == frame_time
+            predicted = np.array([np.polyval(xcoeffs, t), np.polyval(ycoeffs, t)])
+            speed = math.hypot(xcoeffs[0], 2 * ycoeffs[0] * t + ycoeffs[1])
+            tolerance = min(radius_tolerance, speed * (later - frame_time) / 2)
+            if not np.any(np.hypot(*(coords[in_frame] - predicted).T) <= tolerance):
+                break
+            offset = t
+            later = frame_time
+
+        return offset
+
+    @cached_result
+    def get_launch_velocity_components(self):
+        # Fits x(t) as a straight line and y(t) as a parabola through the timed coordinates
+        # Returns the horizontal and vertical components of the launch velocity in m/s
+        xcoeffs, _ = self.fit_polynomial(1, self.tcoords, self.hcoords)
+        ycoeffs, _ = self.fit_polynomial(2, self.tcoords, self.vcoords)
+
+        # Gradients at t = 0, the launch
+        return xcoeffs[0], ycoeffs[1]
+
+    @cached_result
     def get_projectile_function_coeffs(self):
         # Get the coefficients of the projectile function
         coeffs = self.get_curve_function_coeffs(2, self.hcoords, self.vcoords)
@@ -255,17 +501,27 @@ class ProjectileMotion(Calculate, Coordinates):
 
         return a, b, c
 
+    @cached_result
     def check_projectile_type(self):
-        # Estimate the gradient of the first five points of the projectile function
-        gradient = self.estimate_initial_gradient(self.hcoords, self.vcoords)
+        if self.timed:
+            # Launched at an angle if the projectile starts off moving upwards
+            gradient = self.get_launch_velocity_components()[1]
+        else:
+            # Estimate the gradient of the first five points of the projectile function
+            gradient = self.estimate_initial_gradient(self.hcoords, self.vcoords)
         if gradient > 0:
             return 'A'
         else:
             return 'H'
 
+    @cached_result
     def estimate_initial_angle(self):
+        # Direction of the launch velocity when the frame times are known
+        if self.timed and self.projectile_type == 'A':
+            vx, vy = self.get_launch_velocity_components()
+            angle = math.atan2(vy, abs(vx))
         # Compare linear coefficient to obtain the value of theta
-        if self.projectile_type == 'A':
+        elif self.projectile_type == 'A':
             angle = math.atan(self.b)
         # Angle = 0 for horizontal projectile motion
         elif self.projectile_type == 'H':
@@ -274,13 +530,23 @@ class ProjectileMotion(Calculate, Coordinates):
         # Returns angle in radians
         return angle
 
+    @cached_result
     def estimate_initial_velocity(self):
+        # Magnitude of the fitted launch velocity when the frame times are known
+        # (only the horizontal component for horizontal projectile motion, where theta = 0)
+        if self.timed:
+            vx, vy = self.get_launch_velocity_components()
+            if self.projectile_type == 'A':
+                return math.hypot(vx, vy)
+            return abs(vx)
+
         # Compare quadratic coefficient and substitute value of theta obtained earlier to obtain value of initial velocity
         initial_velocity = math.sqrt(
             (self.g) / (2 * abs(self.a) * (math.cos(self.theta)) ** 2))
 
         return initial_velocity
 
+    @cached_result
     def get_time_of_flight(self):
         # Calculate the time of flight
         if self.projectile_type == 'H':
@@ -291,12 +557,14 @@ class ProjectileMotion(Calculate, Coordinates):
 
         return tmax
 
+    @cached_result
     def get_vertical_distance_travelled(self):
-        vcoords = sorted(self.vcoords)
-        height = vcoords[-1]
+        # Only the highest point is needed, so there is no need to sort
+        height = max(self.vcoords)
 
         return height
 
+    @cached_result
     def get_horizontal_distance_travelled(self):
 
         if self.projectile_type == 'H':
@@ -310,35 +578,156 @@ class ProjectileMotion(Calculate, Coordinates):
         return hdistance
 
     def get_actual_trajectory_coords(self):
-        xactual = [(x - self.get_horizontal_translation_units(self.hcoords))
-                   for x in self.hcoords]
-        yactual = [(y - self.get_vertical_translation_units(self.vcoords))
-                   for y in self.vcoords]
+        # Translates the coordinates so the trajectory starts at the origin
+        xactual = np.asarray(self.hcoords) - self.get_horizontal_translation_units(self.hcoords)
+        yactual = np.asarray(self.vcoords) - self.get_vertical_translation_units(self.vcoords)
 
         return xactual, yactual
 
-    def get_predicted_trajectory_coords(self):
-        x0 = 0
-        y0 = 0
+    def get_predicted_trajectory_coords(self, num_points=None, t=None):
+        # Create an array of time values, unless the caller supplies their own
+        # By default there is one predicted point for each measured coordinate
+        if t is None:
+            if num_points is None:
+                num_points = len(self.hcoords)
+            t = np.linspace(0, self.get_time_of_flight(), num_points)
+        else:
+            t = np.asarray(t, dtype=np.float64)
+
+        # Horizontal and vertical components of the initial velocity
+        vx = self.initial_velocity * math.cos(self.theta)
+        vy = self.initial_velocity * math.sin(self.theta)
 
-        # Create an array of time values
-        t = np.linspace(0, self.get_time_of_flight(), len(self.hcoords))
+        # Calculate the x and y coordinates of the projectile at every time value at once
+        xpredicted = vx * t
+        ypredicted = vy * t - 0.5 * self.g * t ** 2
 
-        # Initialize lists to store x and y coordinates
-        xpredicted = []
-        ypredicted = []
+        return xpredicted, ypredicted
 
-        # Calculate and append the x and y coordinates of the projectile to the lists
-        for i in range(len(t)):
-            x = x0 + self.initial_velocity * np.cos(self.theta) * t[i]
-            y = y0 + self.initial_velocity * \
-                np.sin(self.theta) * t[i] - 0.5 * self.g * t[i]**2
-            xpredicted.append(x)
-            ypredicted.append(y)
+    def get_drag_ground_level(self):
+        # Height the projectile lands at relative to its launch point, as assumed by get_time_of_flight
+        if self.projectile_type == 'H':
+            return -self.get_vertical_distance_travelled()
+        return 0
+
+    def get_drag_trajectory_coords(self, mass, drag_coefficient=SPHERE_DRAG_COEFFICIENT, record_every=10):
+        # Predicted path with quadratic air resistance for a ball of the given mass (in kg),
+        # using the diameter of the ball measured from the video
+        ball_diameter = self.pixel_diameter * self.conversion_ratio
+        ground = self.get_drag_ground_level()
+        hdistance, _, (xpredicted, ypredicted) = simulate_drag_trajectories(
+            self.initial_velocity, self.theta, mass, ball_diameter, drag_coefficient,
+            g=self.g, ground=ground, record_every=record_every)
+
+        # Drops the samples after the projectile has landed and ends the path at the landing point
+        in_flight = ~np.isnan(xpredicted)
+        xpredicted = np.append(xpredicted[in_flight], hdistance)
+        ypredicted = np.append(ypredicted[in_flight], ground)
 
         return xpredicted, ypredicted
 
+    def get_drag_horizontal_distance(self, mass, drag_coefficient=SPHERE_DRAG_COEFFICIENT):
+        # Range with quadratic air resistance; mass and drag_coefficient can be arrays to sweep many values at once
+        ball_diameter = self.pixel_diameter * self.conversion_ratio
+        hdistance, _, _ = simulate_drag_trajectories(
+            self.initial_velocity, self.theta, mass, ball_diameter, drag_coefficient,
+            g=self.g, ground=self.get_drag_ground_level())
+
+        return hdistance
+
+    @timed_stage('uncertainty')
+    def estimate_uncertainty(self, num_samples=2000, confidence=0.95, seed=None):
+        # Bootstrap estimate of the uncertainty in the launch angle, velocity, range and time of flight
+        # Each sample redraws the cleaned centroids and the radius values (and so the conversion ratio)
+        # with replacement, and all samples are refitted together in one batched least-squares solve
+        rng = np.random.default_rng(seed)
+
+        # Works from pixel coordinates so that every sample can use its own conversion ratio
+        tcoords = np.asarray(self.tcoords) if self.timed else None
+        hpixels = np.asarray(self.hcoords) / self.conversion_ratio
+        vpixels = np.asarray(self.vcoords) / self.conversion_ratio
+        radii = np.asarray(self.remove_list_anomalies(self.video.get_radius_values()))
+        ball_diameter = self.pixel_diameter * self.conversion_ratio
+
+        # Resampled radii give a spread of pixel diameters, and so of conversion ratios
+        radius_samples = radii[rng.integers(0, len(radii), (num_samples, len(radii)))]
+        ratios = ball_diameter / (2 * radius_samples.mean(axis=1))
+
+        # Resampled coordinates are kept in their original order, so the first point is still the launch point
+        num_points = len(hpixels)
+        indices = np.sort(rng.integers(0, num_points, (num_samples, num_points)), axis=1)
+        # A parabola needs at least three distinct values of t (or x), and centroids are whole pixels,
+        # so different points can share an x value (near the top of the flight, for example)
+        # All samples are solved together, so one that cannot be fitted would fail all of them
+        fitted_against = np.sort((tcoords if self.timed else hpixels)[indices], axis=1)
+        distinct = 1 + np.sum(np.diff(fitted_against, axis=1) != 0, axis=1)
+        indices, ratios = indices[distinct >= 3], ratios[distinct >= 3]
+        hsamples = hpixels[indices] * ratios[:, None]
+        vsamples = vpixels[indices] * ratios[:, None]
+
+        # Same equations as estimate_initial_angle, estimate_initial_velocity, get_time_of_flight
+        # and get_horizontal_distance_travelled, applied to every sample at once
+        if self.timed:
+            tsamples = tcoords[indices]
+            vx = self.fit_polynomial(1, tsamples, hsamples)[0][:, 0]
+            vy = self.fit_polynomial(2, tsamples, vsamples)[0][:, 1]
+            if self.projectile_type == 'A':
+                theta = np.arctan2(vy, np.abs(vx))
+                initial_velocity = np.hypot(vx, vy)
+            else:
+                theta = np.zeros_like(vx)
+                initial_velocity = np.abs(vx)
+        else:
+            coeffs, _ = self.fit_polynomial(2, hsamples, vsamples)
+            a, b = coeffs[:, 0], coeffs[:, 1]
+            if self.projectile_type == 'A':
+                theta = np.arctan(b)
+            else:
+                theta = np.zeros_like(b)
+            initial_velocity = np.sqrt(self.g / (2 * np.abs(a) * np.cos(theta) ** 2))
+        if self.projectile_type == 'A':
+            time_of_flight = 2 * initial_velocity * np.sin(theta) / self.g
+        else:
+            time_of_flight = np.sqrt(2 * vsamples.max(axis=1) / self.g)
+        hdistance = initial_velocity * np.cos(theta) * time_of_flight
+
+        samples = {
+            'initial_angle': self.convert_radians_to_degrees(theta),
+            'initial_velocity': initial_velocity,
+            'horizontal_distance': hdistance,
+            'time_of_flight': time_of_flight,
+        }
+        estimates = self.get_results()
+
+        # Percentile confidence interval for each quantity
+        tail = (1 - confidence) / 2 * 100
+        uncertainty = {}
+        for name, values in samples.items():
+            lower, upper = np.nanpercentile(values, [tail, 100 - tail])
+            uncertainty[name] = {
+                'estimate': estimates[name],
+                'lower': float(lower),
+                'upper': float(upper),
+                'std': float(np.nanstd(values)),
+            }
+
+        return uncertainty
+
+    def get_results(self):
+        # Summarises the analysis as a plain dictionary that can be printed, saved or sent between processes
+        return {
+            'projectile_type': self.projectile_type,
+            'initial_angle': float(self.convert_radians_to_degrees(self.theta)),
+            'initial_velocity': float(self.initial_velocity),
+            'horizontal_distance': float(self.hdistance_travelled),
+            'time_of_flight': float(self.get_time_of_flight()),
+        }
+
     def plot_trajectories(self):
+        # Imported here because pyplot takes longer to import than the whole analysis does to run,
+        # and scripted or batch runs never plot anything
+        import matplotlib.pyplot as plt
+
         xactual, yactual = self.get_actual_trajectory_coords()
         xpredicted, ypredicted = self.get_predicted_trajectory_coords()
 
@@ -372,3 +761,32 @@ class ProjectileMotion(Calculate, Coordinates):
 
         # Display the figure
         plt.show()
+
+
+def analyse_video(file_name, ball_diameter, workers=1, tracking=False, cache=None, timed=False,
+                  profile=None):
+    # Runs the full analysis on a video file without opening any windows or prompting the user
+    # More than one worker splits the detection of a single long clip across several threads
+    # Tracking only searches around the ball once it has been found
+    # A DetectionCache skips detection for clips that have already been analysed with the same settings
+    # Timed fitting uses the frame times from the video to fit x(t) and y(t)
+    # A DetectionProfile changes the ball colour, kernel and minimum radius used for detection
+    with stage('detect_clip'):
+        video = Video(file_name, display=False, workers=workers, tracking=tracking, cache=cache, profile=profile)
+    with stage('analyse_clip'):
+        return ProjectileMotion(video, ball_diameter, timed).get_results()
+
+
+def analyse_tracks(file_name, ball_diameter, workers=1, cache=None, timed=False, profile=None, min_length=5):
+    # Analyses every moving ball in a video separately, e.g. a drill with several projectiles in one recording
+    # Returns the results of each track keyed by track id, in the order the balls first appeared
+    video = Video(file_name, display=False, workers=workers, cache=cache, profile=profile)
+    return {track_id: ProjectileMotion(detections, ball_diameter, timed).get_results()
+            for track_id, detections in video.get_tracks(min_length).items()}
+
+
+def analyse_detections(centroid_coords, radius_values, ball_diameter, timestamps=None):
+    # Runs the analysis on centroid and radius values that have already been detected
+    # If the times of the detections are given, x(t) and y(t) are fitted instead of y(x)
+    detections = BallDetections(centroid_coords, radius_values, timestamps)
+    return ProjectileMotion(detections, ball_diameter, timestamps is not None).get_results()
@@ -0,0 +1,626 @@
+import cv2
+import json
+import os
+import numpy as np
+from collections import deque
+
+from instrumentation import stage, count
+
+
+# Size of the square kernel used to clean up the mask
+KERNEL_SIZE = 5
+
+# Contours with a smaller enclosing circle than this (in pixels) are ignored
+MIN_RADIUS = 10
+
+# Part of the detection cache key; bump it whenever find_ball or BallTracker start finding different
+# detections for the same settings, so detections cached by the old code are never reused
+DETECTION_VERSION = 1
+
+
+class DetectionProfile:
+    # Detection settings for one ball colour, lighting set-up or camera
+    # Everything that stays the same from frame to frame (the colour bounds, the morphology kernel and
+    # the optional colour lookup table) is built once here, so find_ball allocates no constants per frame
+    def __init__(self, name='default', lower_bound=(29, 86, 6), upper_bound=(64, 255, 255),
+                 kernel_size=KERNEL_SIZE, min_radius=MIN_RADIUS, use_lut=False, downscale=1):
+        # Both size the arrays and frames detection works on, so anything but a whole number of pixels fails
+        for setting, value in (('kernel_size', kernel_size), ('downscale', downscale)):
+            if isinstance(value, bool) or not isinstance(value, (int, np.integer)) or value < 1:
+                raise ValueError(f'The {setting} must be a whole number of at least 1, not {value!r}.')
+
+        self.name = name
+        # Range of colour for the ball in HSV space
+        # A lower hue above the upper hue wraps around 180, e.g. (170, ...) to (10, ...) for a red ball
+        self.lower_bound = np.array(lower_bound, np.uint8)
+        self.upper_bound = np.array(upper_bound, np.uint8)
+        self.kernel_size = kernel_size
+        # Contours with a smaller enclosing circle than this (in pixels) are ignored
+        self.min_radius = min_radius
+        # Square kernel used to clean up the mask
+        self.kernel = np.ones((kernel_size, kernel_size), np.uint8)
+
+        # Balls are first searched for in frames shrunk by this factor, then measured at full resolution
+        # The kernel shrinks with the frame so it removes the same size of noise
+        self.downscale = downscale
+        downscaled_size = max(1, round(kernel_size / downscale))
+        self.downscaled_kernel = np.ones((downscaled_size, downscaled_size), np.uint8)
+
+        # A single inRange cannot express a wrapped hue range, so those always use the lookup table
+        self.use_lut = use_lut
+        self.wraps = self.lower_bound[0] > self.upper_bound[0]
+        self.lut = self.build_lut() if use_lut or self.wraps else None
+
+    def __reduce__(self):
+        # Sends only the settings to other processes, which rebuild the 16 MB lookup table themselves
+        return (DetectionProfile, (self.name, self.lower_bound.tolist(), self.upper_bound.tolist(),
+                                   self.kernel_size, self.min_radius, self.use_lut, self.downscale))
+
+    @classmethod
+    def load(cls, file_name):
+        # Loads a profile from a JSON file holding any of the keyword arguments of __init__
+        with open(file_name) as profile_file:
+            settings = json.load(profile_file)
+        settings.setdefault('name', os.path.splitext(os.path.basename(file_name))[0])
+
+        return cls(**settings)
+
+    def get_parameters(self):
+        # Every setting that changes which detections are found (the lookup table gives the same mask)
+        parameters = {
+            'lower_bound': self.lower_bound.tolist(),
+            'upper_bound': self.upper_bound.tolist(),
+            'kernel_size': self.kernel_size,
+            'min_radius': self.min_radius,
+        }
+        # Left out at full resolution so detections cached before downscaling existed still match
+        if self.downscale != 1:
+            parameters['downscale'] = self.downscale
+
+        return parameters
+
+    def build_lut(self):
+        # Table of 2^24 bytes saying whether each BGR colour is a ball colour, indexed by
+        # blue + 256 * green + 65536 * red (the order of the bytes in a little-endian BGRA pixel)
+        colours = np.arange(1 << 24, dtype='<u4').view(np.uint8).reshape(4096, 4096, 4)
+        hsv = cv2.cvtColor(np.ascontiguousarray(colours[..., :3]), cv2.COLOR_BGR2HSV)
+
+        if self.wraps:
+            # Two ranges, from the lower hue up to 180 and from 0 up to the upper hue
+            lut = cv2.inRange(hsv, self.lower_bound, np.array([179, *self.upper_bound[1:]], np.uint8))
+            lut |= cv2.inRange(hsv, np.array([0, *self.lower_bound[1:]], np.uint8), self.upper_bound)
+        else:
+            lut = cv2.inRange(hsv, self.lower_bound, self.upper_bound)
+
+        return lut.ravel()
+
+    def get_mask(self, frame, kernel=None):
+        # Returns a mask of the ball-coloured pixels in the frame, with noise removed and gaps closed
+        if kernel is None:
+            kernel = self.kernel
+
+        if self.lut is None:
+            # Convert the frame to HSV colour space and threshold it to get only ball colours
+            with stage('hsv'):
+                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            with stage('in_range'):
+                mask = cv2.inRange(hsv, self.lower_bound, self.upper_bound)
+        else:
+            # Looks every pixel's colour up directly, skipping the HSV conversion
+            with stage('lut'):
+                bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+                index = np.bitwise_and(bgra.view('<u4')[..., 0], 0xFFFFFF)
+                mask = self.lut[index]
+
+        # Perform a series of morphological operations to remove noise and close gaps in the mask
+        with stage('morphology'):
+            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+            return cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+
+# Settings used when no profile is given: a green ball in ordinary indoor lighting
+DEFAULT_PROFILE = DetectionProfile()
+
+
+def find_ball(frame, profile=DEFAULT_PROFILE):
+    # Finds every ball-coloured contour in a frame that is large enough to be the ball
+    # Returns a list of (centroid, (circle x, circle y), radius, contour area) tuples
+    if profile.downscale != 1:
+        return find_ball_downscaled(frame, profile)
+
+    mask = profile.get_mask(frame)
+
+    # Find contours in the mask
+    with stage('find_contours'):
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+
+    balls = []
+    with stage('circles_and_moments'):
+        # Loop over the contours
+        for c in cnts:
+            # Compute the minimum enclosing circle for the contour
+            ((x, y), radius) = cv2.minEnclosingCircle(c)
+
+            # Only proceed if the radius is large enough
+            if radius > profile.min_radius:
+                # Compute the centroid of the contour
+                M = cv2.moments(c)
+                if M["m00"] == 0:
+                    continue
+                centre = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+                balls.append((centre, (x, y), radius, M["m00"]))
+
+    count('contours', len(cnts))
+    count('detections', len(balls))
+    return balls
+
+
+def find_ball_downscaled(frame, profile):
+    # Finds the balls in a shrunken copy of the frame, which is several times quicker on large frames,
+    # then measures each one again at full resolution in a small window around it
+    # The refined centroids are sub-pixel (floats), taken from the moments of the full-resolution mask
+    scale = profile.downscale
+    with stage('downscale'):
+        small_frame = shrink_frame(frame, scale)
+    mask = profile.get_mask(small_frame, profile.downscaled_kernel)
+
+    with stage('find_contours'):
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+
+    balls = []
+    height, width = frame.shape[:2]
+    for c in cnts:
+        ((x, y), radius) = cv2.minEnclosingCircle(c)
+        # A little smaller than the full-resolution limit, as shrinking blurs the edge of the ball
+        if radius <= profile.min_radius / scale - 1:
+            continue
+
+        # Window around the ball at full resolution, with room for the error from shrinking the frame
+        padding = int((radius + 2) * scale) + profile.kernel_size
+        left = max(0, int(x * scale) - padding)
+        top = max(0, int(y * scale) - padding)
+        right = min(width, int(x * scale) + padding)
+        bottom = min(height, int(y * scale) + padding)
+
+        ball = refine_ball(frame[top:bottom, left:right], profile)
+        if ball is None:
+            continue
+        (cx, cy), (circle_x, circle_y), radius, area = ball
+        balls.append(((cx + left, cy + top), (circle_x + left, circle_y + top), radius, area))
+
+    count('contours', len(cnts))
+    count('detections', len(balls))
+    return balls
+
+
+def shrink_frame(frame, scale):
+    # Shrinks the frame by an integer factor, averaging the pixels so noise is smoothed out
+    # Powers of two are halved one level at a time (a box-filter pyramid), which OpenCV does
+    # several times faster than a single large INTER_AREA reduction
+    while scale % 2 == 0:
+        frame = cv2.resize(frame, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        scale //= 2
+    if scale != 1:
+        frame = cv2.resize(frame, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+
+    return frame
+
+
+def refine_ball(window, profile):
+    # Measures the largest ball-coloured contour in a full-resolution window, or returns None if it is too small
+    mask = profile.get_mask(window)
+    with stage('refine'):
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+        if len(cnts) == 0:
+            return None
+
+        c = max(cnts, key=cv2.contourArea)
+        ((x, y), radius) = cv2.minEnclosingCircle(c)
+        M = cv2.moments(c)
+        if radius <= profile.min_radius or M["m00"] == 0:
+            return None
+
+        return (M["m10"] / M["m00"], M["m01"] / M["m00"]), (x, y), radius, M["m00"]
+
+
+def predict_position(history, frame_index):
+    # Predicts where a ball will be in the given frame from its last (frame index, x, y) positions,
+    # assuming constant acceleration (a parabola in image space)
+    # Returns (x, y, speed in pixels per frame), or None if there is no history to predict from
+    if len(history) == 0:
+        return None
+
+    t2, x2, y2 = history[-1]
+    if len(history) == 1:
+        return x2, y2, 0
+
+    t1, x1, y1 = history[-2]
+    vx = (x2 - x1) / (t2 - t1)
+    vy = (y2 - y1) / (t2 - t1)
+    ax = ay = 0
+    if len(history) == 3:
+        t0, x0, y0 = history[0]
+        # Acceleration from the change in velocity between the two most recent intervals
+        interval = (t2 - t0) / 2
+        ax = (vx - (x1 - x0) / (t1 - t0)) / interval
+        ay = (vy - (y1 - y0) / (t1 - t0)) / interval
+
+    dt = frame_index - t2
+    x = x2 + vx * dt + 0.5 * ax * dt ** 2
+    y = y2 + vy * dt + 0.5 * ay * dt ** 2
+    # Distance moved since the last frame, used to widen the search area for fast balls
+    speed = ((vx + ax * dt) ** 2 + (vy + ay * dt) ** 2) ** 0.5
+
+    return x, y, speed
+
+
+class BallTracker:
+    # Follows a single ball from frame to frame, only searching a padded region of interest (ROI)
+    # around where the ball is expected to be, and falling back to the whole frame when it is lost
+    # A track is only confirmed (and the search narrowed to the ROI) once it has moved for a few frames,
+    # so a static ball-coloured object that is bigger than the ball cannot hold on to the tracker
+    def __init__(self, padding_factor=3, min_padding=20, max_missed=5, min_movement=0.1, max_still=5):
+        # The ROI extends this many ball radii (plus min_padding pixels) past the predicted centre
+        self.padding_factor = padding_factor
+        self.min_padding = min_padding
+        # Frames the ball can go missing for before its track is dropped
+        self.max_missed = max_missed
+        # A contour counts as moving if it is more than this many of its radii from every contour in the
+        # previous frame (or, once tracked, from the ball's last position), so noise on the edges of a
+        # static object does not count
+        self.min_movement = min_movement
+        # Frames a confirmed track can stay still for before it is dropped (e.g. once the ball comes to rest)
+        self.max_still = max_still
+
+        # Number of frames searched in full and in an ROI, to see how often tracking pays off
+        self.full_searches = 0
+        self.roi_searches = 0
+        # Number of tracks started, so callers can tell when a different ball is being followed
+        self.tracks_started = 0
+
+        # Private attributes
+        # Last three (frame index, x, y) positions, enough to estimate velocity and acceleration
+        self.__history = deque(maxlen=3)
+        self.__radius = None
+        self.__frame_index = -1
+        self.__missed = 0
+        # Frames in a row that the track has moved, and has stayed still for
+        self.__moving = 0
+        self.__still = 0
+        # Contours found in the previous frame, and whether the whole of it was searched
+        self.__previous_balls = None
+        self.__previous_full = False
+        # Ball returned for the previous frame, if any
+        self.__previous_ball = None
+        # Contour in the previous frame that a newly started track came from (see take_track_start)
+        self.__track_start = None
+
+    def is_confirmed(self):
+        # The track has moved between every pair of positions in its history, so it is not a static object
+        return self.__moving >= self.__history.maxlen
+
+    def predict_position(self, frame_index):
+        # Predicts where the ball will be in the given frame, or returns None if there is nothing to predict from
+        return predict_position(self.__history, frame_index)
+
+    def get_roi(self, frame_shape, frame_index):
+        # Returns the (left, top, right, bottom) bounds of the region to search, or None for the whole frame
+        prediction = self.predict_position(frame_index)
+        if prediction is None or not self.is_confirmed():
+            return None
+
+        x, y, speed = prediction
+        padding = self.get_padding(speed)
+
+        height, width = frame_shape[:2]
+        left = max(0, int(x) - padding)
+        top = max(0, int(y) - padding)
+        right = min(width, int(x) + padding)
+        bottom = min(height, int(y) + padding)
+
+        # The predicted position has left the frame
+        if left >= right or top >= bottom:
+            return None
+
+        return left, top, right, bottom
+
+    def get_padding(self, speed):
+        # Distance around the predicted centre in which the ball is searched for
+        return int(self.padding_factor * self.__radius + self.min_padding + speed)
+
+    def find_ball(self, frame, profile=DEFAULT_PROFILE):
+        # Finds the tracked ball in the next frame of the video
+        # Returns a list holding at most one (centroid, (circle x, circle y), radius, contour area) tuple
+        balls = []
+        roi = self.get_roi(frame.shape, self.__frame_index + 1)
+        if roi is not None:
+            left, top, right, bottom = roi
+            self.roi_searches += 1
+            # Slicing gives a view of the frame, so no pixels are copied
+            balls = find_ball(frame[top:bottom, left:right], profile)
+            # Translates the ROI coordinates back into frame coordinates
+            balls = [((cx + left, cy + top), (x + left, y + top), radius, area)
+                     for (cx, cy), (x, y), radius, area in balls]
+
+        full = len(balls) == 0
+        if full:
+            # Ball lost (or not found yet), so search the whole frame
+            self.full_searches += 1
+            balls = find_ball(frame, profile)
+
+        return self.update(balls, full)
+
+    def update(self, balls, full=True):
+        # Picks the tracked ball from the contours found in the next frame, which can come from
+        # find_ball above or from a detector that has already searched the frame (full is False if
+        # only part of the frame was searched)
+        # Returns a list holding at most one (centroid, (circle x, circle y), radius, contour area) tuple
+        self.__frame_index += 1
+        self.__track_start = None
+        ball = self.choose_ball(balls, self.__previous_balls, self.__previous_full)
+        self.__previous_balls, self.__previous_full = balls, full
+        self.__previous_ball = ball
+        if ball is None:
+            self.__missed += 1
+            if self.__missed > self.max_missed:
+                # The ball has been lost for too long, so the next ball found starts a new track
+                self.drop_track()
+            return []
+
+        centre, _, radius, _ = ball
+        if self.__track_start is not None:
+            start = self.__track_start[0]
+            self.__history.append((self.__frame_index - 1, start[0], start[1]))
+        # The first position of a track is not evidence of movement on its own
+        if len(self.__history) > 0:
+            if self.get_distance(centre, self.__history[-1][1:]) <= self.min_movement * radius:
+                self.__moving = 0
+                self.__still += 1
+            else:
+                self.__moving += 1
+                self.__still = 0
+        self.__history.append((self.__frame_index, centre[0], centre[1]))
+        self.__radius = radius
+        self.__missed = 0
+
+        if self.__still >= self.max_still:
+            # The tracked ball has stopped (or was never a ball), so go back to searching for a moving one
+            self.drop_track()
+
+        return [ball]
+
+    def take_track_start(self):
+        # A track only starts once the ball has moved, so its position in the frame before was not returned
+        # Returns the contour the ball most likely came from in that frame (such as the ball at the
+        # moment of launch) if a track started in the frame just searched, otherwise None
+        start, self.__track_start = self.__track_start, None
+        return start
+
+    def drop_track(self):
+        self.__history.clear()
+        self.__missed = 0
+        self.__moving = 0
+        self.__still = 0
+
+    def get_distance(self, first, second):
+        return ((first[0] - second[0]) ** 2 + (first[1] - second[1]) ** 2) ** 0.5
+
+    def choose_ball(self, balls, previous_balls=None, previous_full=False):
+        # Contours that have not moved since the previous frame are ignored
+        # Once the track is confirmed, picks the contour closest to the predicted position, ignoring
+        # anything too far away to be the tracked ball
+        # Until then, prefers a contour that continues the track so far and otherwise starts a new track
+        # from the largest (only if the whole of the previous frame was searched, as anything outside
+        # the previous frame's ROI could be a static object)
+        if previous_balls is not None:
+            balls = [ball for ball in balls if all(self.get_distance(ball[0], other[0]) > self.min_movement * ball[2]
+                                                   for other in previous_balls)]
+
+        prediction = self.predict_position(self.__frame_index)
+        if prediction is not None:
+            x, y, speed = prediction
+            gate = 2 * self.get_padding(speed)
+            if not self.is_confirmed() and len(self.__history) > 1:
+                # A ball follows a smooth path, so until it is confirmed a track only continues with a
+                # contour close to where its motion so far predicts, unlike a flickering blob
+                gate = max(self.__radius / 4, 2)
+            nearby = [(self.get_distance(ball[0], (x, y)), i) for i, ball in enumerate(balls)]
+            nearby = [(distance, i) for distance, i in nearby if distance <= gate]
+            if len(nearby) > 0:
+                return balls[min(nearby)[1]]
+            if self.is_confirmed():
+                return None
+
+        # New tracks only start from a contour that is known to have moved
+        if len(balls) == 0 or not previous_full:
+            return None
+        # Nothing continues the unconfirmed track, so it was not following a moving ball
+        self.drop_track()
+        self.tracks_started += 1
+        ball = max(balls, key=lambda ball: ball[2])
+
+        # The nearest contour in the previous frame, unless it was already returned for that frame
+        if len(previous_balls) > 0:
+            gate = self.padding_factor * ball[2] + self.min_padding
+            distance, i = min((self.get_distance(ball[0], other[0]), i) for i, other in enumerate(previous_balls))
+            if distance <= gate and previous_balls[i] is not self.__previous_ball:
+                self.__track_start = previous_balls[i]
+
+        return ball
+
+
+class Track:
+    # One ball followed from frame to frame by a MultiBallTracker
+    def __init__(self, track_id, frame_index, centre, radius):
+        self.track_id = track_id
+        # Last three (frame index, x, y) positions, enough to estimate velocity and acceleration
+        self.history = deque([(frame_index, centre[0], centre[1])], maxlen=3)
+        self.radius = radius
+        # Frames in a row that the ball has not been found in
+        self.missed = 0
+
+    def add(self, frame_index, centre, radius):
+        self.history.append((frame_index, centre[0], centre[1]))
+        self.radius = radius
+        self.missed = 0
+
+
+class MultiBallTracker:
+    # Splits the detections of several balls (or a ball and ball-coloured background objects) into
+    # separate tracks, so each one can be fitted on its own instead of corrupting a single fit
+    # Each frame's contours are matched to the nearest predicted track position within a gate,
+    # closest pairs first, and any contour left over starts a new track
+    def __init__(self, padding_factor=3, min_padding=20, max_missed=5):
+        # A contour only joins a track if it is within this many ball radii (plus min_padding pixels
+        # and the distance the ball moves per frame) of where the track predicts the ball to be
+        self.padding_factor = padding_factor
+        self.min_padding = min_padding
+        # Frames a ball can go missing for before its track is closed
+        self.max_missed = max_missed
+
+        # Private attributes
+        self.__active_tracks = []
+        self.__next_id = 0
+
+    def update(self, frame_index, centroids, radii):
+        # Matches the contours found in one frame to the tracks
+        # Returns the id of the track each contour was assigned to
+        track_ids = [None] * len(centroids)
+
+        # Every (distance, track, contour) pair close enough to be the same ball
+        pairs = []
+        for track in self.__active_tracks:
+            x, y, speed = predict_position(track.history, frame_index)
+            gate = self.padding_factor * track.radius + self.min_padding + speed
+            for i, (cx, cy) in enumerate(centroids):
+                distance = ((cx - x) ** 2 + (cy - y) ** 2) ** 0.5
+                if distance <= gate:
+                    pairs.append((distance, track.track_id, i, track))
+
+        # Nearest neighbour assignment, each track and each contour used at most once
+        matched_tracks = set()
+        for distance, track_id, i, track in sorted(pairs, key=lambda pair: pair[:3]):
+            if track_id in matched_tracks or track_ids[i] is not None:
+                continue
+            track.add(frame_index, centroids[i], radii[i])
+            matched_tracks.add(track_id)
+            track_ids[i] = track_id
+
+        # Tracks that were not found have missed another frame, and are closed once they miss too many
+        for track in self.__active_tracks:
+            if track.track_id not in matched_tracks:
+                track.missed += 1
+        self.__active_tracks = [track for track in self.__active_tracks if track.missed <= self.max_missed]
+
+        # Contours that do not belong to any track are new balls
+        for i, track_id in enumerate(track_ids):
+            if track_id is None:
+                self.__active_tracks.append(Track(self.__next_id, frame_index, centroids[i], radii[i]))
+                track_ids[i] = self.__next_id
+                self.__next_id += 1
+
+        return track_ids
+
+    def assign(self, detections):
+        # Runs the tracker over every frame of a DetectionBuffer in order
+        # Returns an int32 array holding the track id of every detection
+        frame_indices = detections.get_frame_indices()
+        centroids = detections.get_centroids()
+        radii = detections.get_radii()
+        track_ids = np.empty(len(detections), np.int32)
+        if len(detections) == 0:
+            return track_ids
+
+        # The detections of each frame are stored next to each other
+        boundaries = np.flatnonzero(np.diff(frame_indices)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(detections)]):
+            track_ids[start:end] = self.update(frame_indices[start], centroids[start:end].tolist(),
+                                               radii[start:end].tolist())
+
+        return track_ids
+
+
+class DetectionBuffer:
+    # Columnar store of detections in typed NumPy arrays that grow by doubling when full
+    # Each detection takes 40 bytes, several times less than a tuple in a Python list,
+    # and the columns can be handed to Coordinates and Calculate as views without copying
+    def __init__(self, capacity=1024):
+        # Private attributes
+        self.__size = 0
+        self.__frame_indices = np.empty(capacity, np.int32)
+        self.__timestamps = np.empty(capacity, np.float64)
+        self.__centroids = np.empty((capacity, 2), np.float64)
+        self.__radii = np.empty(capacity, np.float64)
+        self.__areas = np.empty(capacity, np.float32)
+
+    @classmethod
+    def from_columns(cls, frame_indices, timestamps, centroids, radii, areas):
+        # Wraps existing column arrays (e.g. memory-mapped from a cache) without copying them
+        buffer = cls(capacity=0)
+        buffer.__frame_indices = frame_indices
+        buffer.__timestamps = timestamps
+        buffer.__centroids = centroids
+        buffer.__radii = radii
+        buffer.__areas = areas
+        buffer.__size = len(radii)
+
+        return buffer
+
+    def __len__(self):
+        return self.__size
+
+    def append(self, frame_index, timestamp, centre, radius, area):
+        if self.__size == len(self.__radii):
+            self.__grow()
+
+        i = self.__size
+        self.__frame_indices[i] = frame_index
+        self.__timestamps[i] = timestamp
+        self.__centroids[i] = centre
+        self.__radii[i] = radius
+        self.__areas[i] = area
+        self.__size += 1
+
+    def add_balls(self, frame_index, timestamp, balls):
+        # Stores every ball that find_ball returned for a frame
+        for centre, _, radius, area in balls:
+            self.append(frame_index, timestamp, centre, radius, area)
+
+    def __grow(self):
+        # Doubles the capacity of every column, keeping the detections stored so far
+        capacity = max(1, 2 * len(self.__radii))
+        self.__frame_indices = self.__resize(self.__frame_indices, capacity)
+        self.__timestamps = self.__resize(self.__timestamps, capacity)
+        self.__centroids = self.__resize(self.__centroids, capacity)
+        self.__radii = self.__resize(self.__radii, capacity)
+        self.__areas = self.__resize(self.__areas, capacity)
+
+    def __resize(self, column, capacity):
+        resized = np.empty((capacity,) + column.shape[1:], column.dtype)
+        resized[:self.__size] = column[:self.__size]
+        return resized
+
+    # Getter methods returning views of the filled part of each column
+    def get_frame_indices(self):
+        return self.__frame_indices[:self.__size]
+
+    def get_timestamps(self):
+        # Seconds from the start of the video
+        return self.__timestamps[:self.__size]
+
+    def get_centroids(self):
+        # (n, 2) array of opencv pixel coordinates
+        return self.__centroids[:self.__size]
+
+    def get_radii(self):
+        return self.__radii[:self.__size]
+
+    def get_areas(self):
+        return self.__areas[:self.__size]
+
+    def get_nbytes(self):
+        # Memory used by the detections stored so far
+        return self.__size * (4 + 8 + 16 + 8 + 4)
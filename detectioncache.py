@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from detection import DetectionBuffer
+
+
+# Column files written for every cached clip; each one can be memory-mapped on its own
+COLUMNS = ['frame_indices', 'timestamps', 'centroids', 'radii', 'areas']
+
+
+class DetectionCache:
+    # On-disk cache of the detections found in a video, so re-analysing a clip with the same
+    # detection settings skips decoding and detection entirely
+    # Entries are keyed by a hash of the video's contents plus the detection parameters, and the
+    # least recently used entries are deleted once the cache grows past max_bytes
+    def __init__(self, directory='cache', max_bytes=1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def hash_file(file_name, block_size=1024 ** 2):
+        # Hashes the contents of the file in blocks, so large videos are never held in memory
+        file_hash = hashlib.blake2b(digest_size=16)
+        with open(file_name, 'rb') as video_file:
+            for block in iter(lambda: video_file.read(block_size), b''):
+                file_hash.update(block)
+
+        return file_hash.hexdigest()
+
+    def get_key(self, file_name, parameters):
+        # Combines the video's hash with the detection parameters, so changing any of them misses the cache
+        key_hash = hashlib.blake2b(digest_size=16)
+        key_hash.update(self.hash_file(file_name).encode())
+        key_hash.update(json.dumps(parameters, sort_keys=True).encode())
+
+        return key_hash.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        # Returns the cached DetectionBuffer, or None if this clip has not been cached
+        entry_path = self.get_entry_path(key)
+        try:
+            # Memory-mapped, so only the parts that are actually used are read from disk
+            columns = [np.load(os.path.join(entry_path, f'{column}.npy'), mmap_mode='r') for column in COLUMNS]
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Marks the entry as recently used for eviction
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            return None
+
+        return DetectionBuffer.from_columns(*columns)
+
+    def save(self, key, detections):
+        # Writes the columns to a temporary directory first and renames it into place,
+        # so other processes never see a half-written entry
+        temporary_path = os.path.join(self.directory, f'.{key}.{uuid.uuid4().hex}')
+        os.makedirs(temporary_path)
+        columns = [detections.get_frame_indices(), detections.get_timestamps(), detections.get_centroids(),
+                   detections.get_radii(), detections.get_areas()]
+        for column, values in zip(COLUMNS, columns):
+            np.save(os.path.join(temporary_path, f'{column}.npy'), values)
+
+        try:
+            os.rename(temporary_path, self.get_entry_path(key))
+        except OSError:
+            # Another process cached the same clip first
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+        self.evict()
+
+    def get_entries(self):
+        # Returns (last used time, size in bytes, path) for every complete entry in the cache
+        entries = []
+        for name in os.listdir(self.directory):
+            entry_path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(entry_path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+                entries.append((os.stat(entry_path).st_mtime, size, entry_path))
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                continue
+
+        return entries
+
+    def evict(self):
+        # Deletes the least recently used entries until the cache fits within max_bytes
+        entries = sorted(self.get_entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
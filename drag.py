@@ -0,0 +1,88 @@
+import numpy as np
+
+from instrumentation import timed_stage
+
+
+# Density of air at sea level and 15 degrees C, in kg/m^3
+AIR_DENSITY = 1.225
+
+# Drag coefficient of a smooth sphere
+SPHERE_DRAG_COEFFICIENT = 0.47
+
+
+@timed_stage('drag')
+def simulate_drag_trajectories(speed, angle, mass, diameter, drag_coefficient=SPHERE_DRAG_COEFFICIENT,
+                               g=9.81, ground=0.0, air_density=AIR_DENSITY, dt=2e-3, max_time=10.0,
+                               record_every=None):
+    # Integrates projectile motion with quadratic air resistance for many launch conditions at once
+    # Every argument up to ground can be a scalar or an array; they are broadcast together and each
+    # element is one trajectory launched from (0, 0) with the given speed (m/s) and angle (radians)
+    # Uses fixed-step fourth-order Runge-Kutta, stopping once every trajectory has fallen below the ground
+    # Returns the range and time of flight of every trajectory (NaN if it has not landed by max_time),
+    # and, if record_every is set, the x and y positions every record_every steps (NaN once landed)
+    speed, angle, mass, diameter, drag_coefficient, g, ground = np.broadcast_arrays(
+        *[np.asarray(value, dtype=np.float64) for value in
+          (speed, angle, mass, diameter, drag_coefficient, g, ground)])
+    shape = speed.shape
+    speed, angle, mass, diameter, drag_coefficient, g, ground = [
+        value.ravel() for value in (speed, angle, mass, diameter, drag_coefficient, g, ground)]
+
+    # Drag force is 0.5 * rho * Cd * A * v^2, so the drag acceleration is k * v^2 with k as below
+    area = np.pi * (diameter / 2) ** 2
+    k = 0.5 * air_density * drag_coefficient * area / mass
+
+    def acceleration(vx, vy):
+        # Drag acts against the velocity, gravity acts downwards
+        v = np.hypot(vx, vy)
+        return -k * v * vx, -g - k * v * vy
+
+    x = np.zeros_like(speed)
+    y = np.zeros_like(speed)
+    vx = speed * np.cos(angle)
+    vy = speed * np.sin(angle)
+
+    ranges = np.full_like(speed, np.nan)
+    times_of_flight = np.full_like(speed, np.nan)
+    flying = np.ones(speed.shape, dtype=bool)
+
+    path_x = [x.copy()]
+    path_y = [y.copy()]
+
+    t = 0.0
+    step = 0
+    while flying.any() and t < max_time:
+        # Fourth-order Runge-Kutta step for position and velocity
+        ax1, ay1 = acceleration(vx, vy)
+        ax2, ay2 = acceleration(vx + 0.5 * dt * ax1, vy + 0.5 * dt * ay1)
+        ax3, ay3 = acceleration(vx + 0.5 * dt * ax2, vy + 0.5 * dt * ay2)
+        ax4, ay4 = acceleration(vx + dt * ax3, vy + dt * ay3)
+
+        new_x = x + dt * (vx + dt / 6 * (ax1 + ax2 + ax3))
+        new_y = y + dt * (vy + dt / 6 * (ay1 + ay2 + ay3))
+        vx = vx + dt / 6 * (ax1 + 2 * ax2 + 2 * ax3 + ax4)
+        vy = vy + dt / 6 * (ay1 + 2 * ay2 + 2 * ay3 + ay4)
+
+        # Trajectories that crossed the ground during this step land at the linearly interpolated point
+        landed = flying & (y >= ground) & (new_y < ground)
+        if landed.any():
+            fraction = (y[landed] - ground[landed]) / (y[landed] - new_y[landed])
+            ranges[landed] = x[landed] + fraction * (new_x[landed] - x[landed])
+            times_of_flight[landed] = t + fraction * dt
+            flying &= ~landed
+
+        x, y = new_x, new_y
+        t += dt
+        step += 1
+
+        if record_every is not None and step % record_every == 0:
+            path_x.append(np.where(flying, x, np.nan))
+            path_y.append(np.where(flying, y, np.nan))
+
+    ranges = ranges.reshape(shape)
+    times_of_flight = times_of_flight.reshape(shape)
+    if record_every is None:
+        return ranges, times_of_flight, None
+
+    path_x = np.array(path_x).reshape((-1,) + shape)
+    path_y = np.array(path_y).reshape((-1,) + shape)
+    return ranges, times_of_flight, (path_x, path_y)
@@ -0,0 +1,166 @@
+import math
+
+import numpy as np
+
+
+class OnlineProjectileEstimator:
+    # Fits the parabola y = ax^2 + bx + c to centroids as they arrive, one at a time
+    # Only running sums of the least-squares normal equations are stored, so each new centroid
+    # updates the fit, launch angle and predicted landing point in O(1) without refitting from scratch
+    def __init__(self, conversion_ratio=None, ball_diameter=None, g=9.81):
+        # Metres per pixel; if not given it is worked out from ball_diameter and the running average radius
+        self.conversion_ratio = conversion_ratio
+        self.ball_diameter = ball_diameter
+        self.g = g
+        self.count = 0
+
+        # Private attributes
+        # Sums of x^0 ... x^4 and of y * x^0 ... y * x^2, relative to the first centroid
+        self.__sums_x = np.zeros(5)
+        self.__sums_xy = np.zeros(3)
+        self.__origin = None
+        self.__lowest = 0
+        self.__radius_sum = 0
+        self.__radius_count = 0
+        self.__coeffs = None
+
+    def update(self, centre, radius=None):
+        # Adds a centroid in opencv pixel coordinates (y pointing down)
+        if self.__origin is None:
+            self.__origin = centre
+
+        # Works relative to the first centroid (the launch point), with y pointing up as in matplotlib
+        x = centre[0] - self.__origin[0]
+        y = self.__origin[1] - centre[1]
+
+        powers = x ** np.arange(5, dtype=np.float64)
+        self.__sums_x += powers
+        self.__sums_xy += y * powers[:3]
+        self.__lowest = min(self.__lowest, y)
+        self.count += 1
+
+        if radius is not None:
+            self.__radius_sum += radius
+            self.__radius_count += 1
+
+        # The fit is solved again the next time it is needed
+        self.__coeffs = None
+
+    def get_conversion_ratio(self):
+        # Metres per pixel, or None if neither a ratio nor the ball diameter is known
+        if self.conversion_ratio is not None:
+            return self.conversion_ratio
+        if self.ball_diameter is None or self.__radius_count == 0:
+            return None
+
+        return self.ball_diameter / (2 * self.__radius_sum / self.__radius_count)
+
+    def get_coeffs(self):
+        # Solves the 3x3 normal equations for (a, b, c) in pixels, relative to the launch point
+        # Returns None until there are enough distinct points to define a parabola
+        if self.__coeffs is None and self.count >= 3:
+            s = self.__sums_x
+            normal_matrix = np.array([[s[4], s[3], s[2]],
+                                      [s[3], s[2], s[1]],
+                                      [s[2], s[1], s[0]]])
+            try:
+                coeffs = np.linalg.solve(normal_matrix, self.__sums_xy[::-1])
+            except np.linalg.LinAlgError:
+                return None
+            self.__coeffs = tuple(coeffs)
+
+        return self.__coeffs
+
+    def get_direction(self):
+        # 1 if the projectile is moving right, -1 if it is moving left
+        return 1 if self.__sums_x[1] >= 0 else -1
+
+    def get_projectile_type(self):
+        # 'A' for a projectile launched at an angle, 'H' for one launched horizontally (or downwards)
+        coeffs = self.get_coeffs()
+        if coeffs is None:
+            return None
+
+        a, b, c = coeffs
+        return 'A' if b * self.get_direction() > 0 else 'H'
+
+    def get_initial_angle(self):
+        # Launch angle in radians, taken from the gradient of the parabola at the launch point
+        coeffs = self.get_coeffs()
+        if coeffs is None:
+            return None
+        if self.get_projectile_type() == 'H':
+            return 0
+
+        return math.atan(coeffs[1] * self.get_direction())
+
+    def get_initial_velocity(self):
+        # Launch speed in m/s, or None if the fit or the conversion ratio is not available yet
+        coeffs = self.get_coeffs()
+        ratio = self.get_conversion_ratio()
+        if coeffs is None or ratio is None or coeffs[0] == 0:
+            return None
+
+        # Converts the quadratic coefficient from 1/pixels to 1/metres
+        a = coeffs[0] / ratio
+        return math.sqrt(self.g / (2 * abs(a) * math.cos(self.get_initial_angle()) ** 2))
+
+    def get_landing_distance_pixels(self):
+        # Horizontal distance in pixels from the launch point to where the parabola meets the ground
+        # The ground is the launch height for angled projectiles and the lowest point seen so far
+        # for horizontal ones, matching get_time_of_flight in ProjectileMotion
+        coeffs = self.get_coeffs()
+        if coeffs is None:
+            return None
+
+        a, b, c = coeffs
+        # The parabola has to open downwards to ever land
+        if a >= 0:
+            return None
+
+        ground = 0 if self.get_projectile_type() == 'A' else self.__lowest
+        discriminant = b ** 2 - 4 * a * (c - ground)
+        if discriminant < 0:
+            return None
+
+        # Takes the root furthest along the direction of travel
+        roots = [(-b + sign * math.sqrt(discriminant)) / (2 * a) for sign in (1, -1)]
+        distance = max(root * self.get_direction() for root in roots)
+        if distance < 0:
+            return None
+
+        return distance
+
+    def get_predicted_range(self):
+        # Predicted horizontal distance travelled in metres
+        distance = self.get_landing_distance_pixels()
+        ratio = self.get_conversion_ratio()
+        if distance is None or ratio is None:
+            return None
+
+        return distance * ratio
+
+    def get_predicted_landing_point(self):
+        # Predicted landing point in opencv pixel coordinates
+        distance = self.get_landing_distance_pixels()
+        if distance is None:
+            return None
+
+        x = distance * self.get_direction()
+        a, b, c = self.get_coeffs()
+        y = a * x ** 2 + b * x + c
+        return int(self.__origin[0] + x), int(self.__origin[1] - y)
+
+    def get_predicted_path(self, num_points=30):
+        # Points along the fitted parabola from the launch point to the predicted landing point,
+        # as an int32 array in opencv pixel coordinates ready for cv2.polylines
+        distance = self.get_landing_distance_pixels()
+        if distance is None:
+            return None
+
+        a, b, c = self.get_coeffs()
+        x = np.linspace(0, distance * self.get_direction(), num_points)
+        y = a * x ** 2 + b * x + c
+        path = np.column_stack((self.__origin[0] + x, self.__origin[1] - y))
+
+        return np.round(path).astype(np.int32)
@@ -0,0 +1,148 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+
+# Upper bounds of the histogram buckets in microseconds, doubling from 1 us to about 8 s
+HISTOGRAM_BUCKETS = [2 ** i for i in range(24)]
+
+
+class Profiler:
+    # Records how long each stage of the analysis takes (decoding, each step of detection, drawing,
+    # cleaning, fitting...) and how often things happen, for whole clips or live sessions
+    # Every timed stage is kept as an event, so the results can be summarised as histograms or
+    # exported as a trace that opens in chrome://tracing or Perfetto
+    def __init__(self):
+        # Private attributes
+        # (stage name, start in ns, duration in ns, process id, thread id) of every timed stage
+        self.__events = []
+        self.__counters = {}
+        self.__lock = threading.Lock()
+
+    def stage(self, name):
+        # Context manager that times the code inside it as one event of the named stage
+        return StageTimer(self, name)
+
+    def add_event(self, name, start, duration):
+        event = (name, start, duration, os.getpid(), threading.get_ident())
+        with self.__lock:
+            self.__events.append(event)
+
+    def count(self, name, amount=1):
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def get_state(self):
+        # Everything recorded so far, in a form that can be sent between processes
+        with self.__lock:
+            return list(self.__events), dict(self.__counters)
+
+    def merge(self, state):
+        # Adds the events and counters recorded by another Profiler (e.g. in a worker process)
+        events, counters = state
+        with self.__lock:
+            self.__events.extend(events)
+            for name, amount in counters.items():
+                self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def get_summary(self):
+        # Per-stage statistics in milliseconds, with a histogram of durations, plus the counters
+        events, counters = self.get_state()
+        durations = {}
+        for name, _, duration, _, _ in events:
+            durations.setdefault(name, []).append(duration)
+
+        stages = {}
+        for name, values in durations.items():
+            values = np.array(values) / 1e6
+            # Count of events in each bucket, keyed by the bucket's upper bound in microseconds
+            histogram = np.bincount(np.searchsorted(HISTOGRAM_BUCKETS, values * 1e3),
+                                    minlength=len(HISTOGRAM_BUCKETS) + 1)
+            stages[name] = {
+                'count': len(values),
+                'total_ms': float(values.sum()),
+                'mean_ms': float(values.mean()),
+                'p50_ms': float(np.percentile(values, 50)),
+                'p95_ms': float(np.percentile(values, 95)),
+                'max_ms': float(values.max()),
+                'histogram_us': {str(bound): int(n) for bound, n in
+                                 zip(HISTOGRAM_BUCKETS + ['inf'], histogram) if n > 0},
+            }
+
+        return {'stages': stages, 'counters': counters}
+
+    def save_json(self, file_name):
+        with open(file_name, 'w') as output:
+            json.dump(self.get_summary(), output, indent=2)
+
+    def save_trace(self, file_name):
+        # Writes the events in the Chrome trace event format, with times in microseconds
+        events, counters = self.get_state()
+        trace_events = [{'name': name, 'ph': 'X', 'ts': start / 1e3, 'dur': duration / 1e3,
+                         'pid': pid, 'tid': tid} for name, start, duration, pid, tid in events]
+        with open(file_name, 'w') as output:
+            json.dump({'traceEvents': trace_events, 'otherData': {'counters': counters}}, output)
+
+
+class StageTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_event(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+# Instrumentation is off unless a Profiler is enabled, and then costs one check per stage
+_active_profiler = None
+_no_timer = nullcontext()
+
+
+def enable_profiling(profiler=None):
+    # Starts recording every instrumented stage into the given (or a new) Profiler and returns it
+    global _active_profiler
+    _active_profiler = profiler if profiler is not None else Profiler()
+    return _active_profiler
+
+
+def disable_profiling():
+    # Stops recording and returns the Profiler that was in use, if any
+    global _active_profiler
+    profiler, _active_profiler = _active_profiler, None
+    return profiler
+
+
+def stage(name):
+    # Times the code inside the with block as the named stage, if profiling is enabled
+    if _active_profiler is None:
+        return _no_timer
+    return _active_profiler.stage(name)
+
+
+def timed_stage(name):
+    # Decorator that times every call of a function as the named stage, if profiling is enabled
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, amount=1):
+    # Adds to the named counter, if profiling is enabled
+    if _active_profiler is not None:
+        _active_profiler.count(name, amount)
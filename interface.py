@@ -8,10 +8,52 @@ from tkinter import messagebox
 import queue
 from PIL import Image, ImageTk
 
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
 import queue
 import decimal
+import threading
+from os.path import exists
+
+
+# Every frame of the loading animation, resized and packed into one image so it loads in a single read
+SPRITE_SHEET = 'images/loading/sprites.png'
+FRAME_COUNT = 100
+FRAME_SIZE = 120
+SHEET_COLUMNS = 10
+
+
+def build_sprite_sheet():
+    # Resizes the separate loading GIFs and packs them into a grid, saving it for the next launch
+    # (delete the sprite sheet to rebuild it after changing the GIFs)
+    rows = -(-FRAME_COUNT // SHEET_COLUMNS)
+    sheet = Image.new('RGBA', (SHEET_COLUMNS * FRAME_SIZE, rows * FRAME_SIZE))
+    for i in range(FRAME_COUNT):
+        with Image.open(f'images/loading/loading{i}.gif') as image:
+            frame = image.resize((FRAME_SIZE, FRAME_SIZE)).convert('RGBA')
+        sheet.paste(frame, get_sprite_box(i)[:2])
+
+    try:
+        sheet.save(SPRITE_SHEET)
+    except OSError:
+        # Read-only install, so the sheet is rebuilt on every launch
+        pass
+
+    return sheet
+
+
+def load_sprite_sheet():
+    if not exists(SPRITE_SHEET):
+        return build_sprite_sheet()
+
+    sheet = Image.open(SPRITE_SHEET)
+    sheet.load()
+    return sheet
+
+
+def get_sprite_box(index):
+    # (left, top, right, bottom) of a frame in the sprite sheet
+    left = (index % SHEET_COLUMNS) * FRAME_SIZE
+    top = (index // SHEET_COLUMNS) * FRAME_SIZE
+    return left, top, left + FRAME_SIZE, top + FRAME_SIZE
 
 
 class LoadingScreen(tk.Canvas):
@@ -34,14 +76,13 @@ class LoadingScreen(tk.Canvas):
                              'Almost there...', 'Just a moment...', 'Hang on...']
         self.loading_text = self.create_text(
             200, 310, text=self.loading_texts[0], font=('Arial', 12))
-        self.images = [Image.open(
-            f'images/loading/loading{i}.gif') for i in range(100)]
-        self.icon_images = [image.resize((120, 120)) for image in self.images]
-        self.photo_images = [ImageTk.PhotoImage(
-            image) for image in self.icon_images]
+        # The animation frames are decoded on a background thread so the window appears straight away,
+        # and each PhotoImage is only created (on the Tk thread) the first time its frame is shown
+        self.icon_images = None
+        self.photo_images = [None] * FRAME_COUNT
+        threading.Thread(target=self.load_icon_images, daemon=True).start()
         self.image_index = 0
-        self.image_object = self.create_image(
-            200, 220, image=self.photo_images[self.image_index])
+        self.image_object = self.create_image(200, 220)
         # Creates two queues, one for animating the image and the other for updating the loading text.
         self.animate_image_queue = queue.Queue()
         self.loading_text_queue = queue.Queue()
@@ -51,6 +92,19 @@ class LoadingScreen(tk.Canvas):
         self.after(10, self.animate_image)
         self.after(1000, self.update_loading_text)
 
+    def load_icon_images(self):
+        sheet = load_sprite_sheet()
+        self.icon_images = [sheet.crop(get_sprite_box(i)) for i in range(FRAME_COUNT)]
+
+    def get_photo_image(self, index):
+        # Returns the frame at the given index, or None if the frames have not been decoded yet
+        if self.icon_images is None:
+            return None
+        if self.photo_images[index] is None:
+            self.photo_images[index] = ImageTk.PhotoImage(self.icon_images[index])
+
+        return self.photo_images[index]
+
     def update_loading_text(self):
         try:
             self.loading_text_queue.get_nowait()
@@ -74,16 +128,17 @@ class LoadingScreen(tk.Canvas):
         else:
             # Increments the index of the current image being displayed if an item was successfully retrieved
             self.image_index += 1
-            if self.image_index == len(self.icon_images):
+            if self.image_index == FRAME_COUNT:
                 self.image_index = 0
-            self.itemconfig(self.image_object,
-                            image=self.photo_images[self.image_index])
+            photo_image = self.get_photo_image(self.image_index)
+            if photo_image is not None:
+                self.itemconfig(self.image_object, image=photo_image)
             # Updates the position of a progress bar on the Canvas object based on the current progress
             self.coords(self.progress, 51, 302, 50 +
                         self.get_progress_width(), 320)
         finally:
             # Adds 0 to the animate_image_queue queue if the current image index is less than the length of the list of images minus 1 (to prevent an infinite loop).
-            if self.image_index < len(self.icon_images) - 1:
+            if self.image_index < FRAME_COUNT - 1:
                 self.animate_image_queue.put(0)
         self.after(10, self.animate_image)
 
@@ -192,9 +247,9 @@ class PhysicsExplanation:
 
 
 class Display:
-    def __init__(self):
+    def __init__(self, preview_fps=None):
         # Composition
-        self.projectile = ProjectileMotion()
+        self.projectile = ProjectileMotion(preview_fps=preview_fps)
 
     def horizontal_distance_prompt(self):
         initial_angle = round(self.projectile.convert_radians_to_degrees(self.projectile.theta), 2)
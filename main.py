@@ -1,11 +1,38 @@
+import argparse
+
 from interface import *
+from instrumentation import enable_profiling
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='BenJY - A Projectile Motion Simulation')
+    parser.add_argument('--fast', action='store_true',
+                        help='skip the loading screen and go straight to choosing a video')
+    parser.add_argument('--timings', metavar='FILE',
+                        help='write per-stage timing statistics to this JSON file when the analysis finishes')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write every timed stage to this file in the Chrome trace format')
+    parser.add_argument('--preview-fps', type=float, metavar='FPS',
+                        help='show the video on its own thread at up to this many frames per second, '
+                             'so playback does not hold up detection')
+    args = parser.parse_args()
+    if args.preview_fps is not None and args.preview_fps <= 0:
+        parser.error('--preview-fps must be positive')
+
+    profiler = None
+    if args.timings is not None or args.trace is not None:
+        profiler = enable_profiling()
+
     # Displays the loading screen (splash screen)
-    run_splash_screen()
+    if not args.fast:
+        run_splash_screen()
     # Instantiates the Display() class
-    display = Display()
+    display = Display(preview_fps=args.preview_fps)
     # Prompts user to enter the horizontal distance travelled by the projectile
     display.horizontal_distance_prompt()
     # Displays physics explanations
     display.physics_explanations()
+
+    if args.timings is not None:
+        profiler.save_json(args.timings)
+    if args.trace is not None:
+        profiler.save_trace(args.trace)
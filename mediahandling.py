@@ -1,36 +1,127 @@
-import tkinter as tk
 import cv2
 from os.path import exists
-import PIL
-from PIL import Image, ImageTk
 
 import numpy as np
 import sys
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from detection import (find_ball, BallTracker, MultiBallTracker, DetectionBuffer, DEFAULT_PROFILE,
+                       DETECTION_VERSION)
+from estimation import OnlineProjectileEstimator
+from instrumentation import stage, count
 
 class Video:
-    def __init__(self):
+    def __init__(self, file_name=None, display=True, workers=1, preview_fps=None, tracking=False,
+                 ball_diameter=None, cache=None, profile=None):
         self.ok = False
+        # Colour bounds, kernel and minimum radius used to find the ball, shared by the video and webcam paths
+        self.profile = DEFAULT_PROFILE if profile is None else profile
+        # Headless instances never open windows or prompt the user
+        self.display = display
+        # When set, frames are previewed on a separate thread at no more than this rate
+        self.preview_fps = preview_fps
+        # Milliseconds each frame stays on screen when the video is played back without a preview thread
+        self.frame_delay = 100
+        # Milliseconds between checks for new webcam frames
+        self.webcam_poll_delay = 5
         # Private attributes
-        self.__centroid_coords = []
-        self.__radius_values = []
-        
-        self.video_path, self.ready = self.vid_input()
+        # Every detection (frame, time, centroid, radius and area) in one columnar buffer
+        self.__detections = DetectionBuffer()
+        # Trail of detected centroids drawn on top of the video
+        self.trail = CentroidTrail()
+        # Follows one ball and only searches the area around it instead of every whole frame
+        self.tracker = BallTracker() if tracking else None
+        # Frame index and time of the last frame searched, for the tracker's track starts
+        self.__previous_frame = None
+        # Live fit of the trajectory so far, used to overlay the predicted path on the webcam feed
+        # (the predicted range is only shown if the real diameter of the ball is known)
+        self.estimator = OnlineProjectileEstimator(ball_diameter=ball_diameter)
+        # Picks the moving ball out of the contours for the live fit, so a static ball-coloured object
+        # in shot never becomes the launch point
+        self.estimator_tracker = BallTracker()
+
+        if file_name is None:
+            self.video_path, self.ready = self.vid_input()
+        else:
+            # Reuses the detections from an earlier run on the same clip with the same settings
+            if cache is not None:
+                cache_key = cache.get_key(file_name, self.get_detection_parameters())
+                cached_detections = cache.load(cache_key)
+                if cached_detections is not None:
+                    self.__detections = cached_detections
+                    self.video_path, self.ready = None, True
+                    return
+
+            self.video_path, self.ready = self.open_video_file(file_name)
+
         if self.ready == False:
             self.webcam_preview()
+        elif not self.display and workers != 1 and self.tracker is None:
+            # Decoding and detection overlap on several threads when nothing has to be shown
+            # (tracking needs the previous frame's result, so it always runs frame by frame)
+            self.detect_ball_vid_pipelined(workers)
         else:
             self.detect_ball_vid()
 
+        if file_name is not None and cache is not None:
+            cache.save(cache_key, self.__detections)
+
+    def get_detection_parameters(self):
+        # Every setting that changes which detections are found, used to key the detection cache
+        parameters = self.profile.get_parameters()
+        parameters['version'] = DETECTION_VERSION
+        parameters['tracking'] = self.tracker is not None
+        if self.tracker is not None:
+            parameters['min_movement'] = self.tracker.min_movement
+        return parameters
+
     def get_radius_values(self):
-        # Getter method for retrieving list of radius values
-        if len(self.__radius_values) == 0:
+        # Getter method for retrieving the array of radius values
+        if len(self.__detections) == 0:
+            if not self.display:
+                # Headless callers handle the failure themselves
+                raise ValueError('No projectile detected.')
             print('No projectile detected! Please relaunch the program.')
             sys.exit(0)
 
-        return self.__radius_values
+        return self.__detections.get_radii()
 
     def get_centroid_coords(self):
-        # Getter method for retrieving list of centroid values
-        return self.__centroid_coords
+        # Getter method for retrieving the (n, 2) array of centroid values
+        return self.__detections.get_centroids()
+
+    def get_timestamps(self):
+        # Getter method for retrieving the time of every detection in seconds
+        return self.__detections.get_timestamps()
+
+    def get_detections(self):
+        # Getter method for retrieving every detection, including frame indices and timestamps
+        return self.__detections
+
+    def get_tracks(self, min_length=5):
+        # Splits the detections into one BallDetections per moving ball, keyed by track id
+        # Tracks with fewer than min_length detections, or that move less than the ball's own
+        # diameter horizontally (ball-coloured background objects), are left out
+        track_ids = MultiBallTracker().assign(self.__detections)
+        centroids = self.__detections.get_centroids()
+        radii = self.__detections.get_radii()
+        timestamps = self.__detections.get_timestamps()
+
+        tracks = {}
+        for track_id in np.unique(track_ids):
+            in_track = track_ids == track_id
+            if np.count_nonzero(in_track) < min_length:
+                continue
+            if np.ptp(centroids[in_track, 0]) <= 2 * np.mean(radii[in_track]):
+                continue
+            tracks[int(track_id)] = BallDetections(centroids[in_track], radii[in_track], timestamps[in_track])
+
+        return tracks
 
     @staticmethod
     def vid_input():
@@ -63,51 +154,67 @@ class Video:
                 
         return vid_inp, ready
 
+    @staticmethod
+    def open_video_file(file_name):
+        # Opens a video file directly without prompting the user
+        if not exists(file_name):
+            raise FileNotFoundError(f'Video file {file_name} does not exist.')
+
+        vid_inp = cv2.VideoCapture(file_name)
+        if not vid_inp.isOpened():
+            raise ValueError(f'Video file {file_name} could not be opened.')
+
+        return vid_inp, True
+
     def ok_button_pressed(self):
         self.ok = True
 
     def webcam_preview(self):
+        # Tkinter is only needed for the webcam windows, so headless runs never import it
+        import tkinter as tk
+
         root = tk.Tk()
         root.title("Video Feed Preview")
 
         # Create canvas to display video feed
         canvas = tk.Canvas(root, width=640, height=480)
         canvas.pack()
+        display = TkFrameDisplay(canvas, size=(640, 480))
 
         # Add label for instructions to press OK button
         label = tk.Label(root, text="Please position your webcam. Press OK when ready to detect the projectile.")
         label.pack()
 
-        # Create OK button
-        ok_button = tk.Button(root, text="OK", command=lambda:[root.destroy(), self.ok_button_pressed()])
-        ok_button.pack()
-
-        # Capture video feed and display on canvas
-        while not self.ok:
-            ret, frame = self.video_path.read()
-            frame = cv2.flip(frame, 1)
-            if not ret:
-                break
+        # Create OK button (closing the window does the same)
+        def on_ok():
+            self.ok_button_pressed()
+            root.destroy()
 
-            # Convert frame to RGB and resize for display
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(frame, (640, 480))
+        ok_button = tk.Button(root, text="OK", command=on_ok)
+        ok_button.pack()
+        root.protocol("WM_DELETE_WINDOW", on_ok)
 
-            # Display frame on canvas
-            photo = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(frame))
-            canvas.create_image(0, 0, anchor=tk.NW, image=photo)
-            canvas.image = photo
+        # Frames are captured on their own thread, so a slow redraw never holds up the camera
+        self.grabber = FrameGrabber(self.video_path, flip=True)
 
-            # Update tkinter window
-            root.update()
+        def refresh():
+            # Shows the newest frame, then lets Tk sleep until the next one is due
+            captured = self.grabber.read_latest(timeout=0)
+            if captured is None and self.grabber.ended:
+                on_ok()
+                return
+            if captured is not None:
+                display.show(captured[2])
+            root.after(display.get_delay(), refresh)
 
+        # The Tk event loop schedules the redraws instead of a loop that never sleeps
+        root.after(0, refresh)
+        root.mainloop()
 
         self.detect_ball_webcam()
 
     def detect_ball_webcam(self):
-        # Define the range of colour for the ball in HSV space
-        lower_bound = np.array([29, 86, 6])
-        upper_bound = np.array([64, 255, 255])
+        import tkinter as tk
 
         # Create a Tkinter window
         root = tk.Tk()
@@ -118,145 +225,547 @@ class Video:
         canvas_height = 480
         canvas = tk.Canvas(root, width=canvas_width, height=canvas_height)
         canvas.pack()
+        display = TkFrameDisplay(canvas)
 
-        # Create a "Done" button
+        # Create a "Done" button, which stops the detection
         def on_done():
-            # Close the OpenCV window and release the video capture
+            # Close the OpenCV window, release the video capture and close the Tkinter window
             cv2.destroyAllWindows()
-            self.video_path.release()
-            # Close the Tkinter window
+            self.grabber.stop()
             root.destroy()
 
         done_button = tk.Button(root, text="Done", command=on_done)
         done_button.pack()
-
-        while True:
-            # Read a frame from the webcam
-            ret, frame = self.video_path.read()
-            frame = cv2.flip(frame, 1)
+        # Closing the window works the same way as pressing "Done"
+        root.protocol("WM_DELETE_WINDOW", on_done)
+
+        # Frames left over from the preview are not part of the detection
+        self.grabber.clear()
+        first_index = None
+        start_time = time.monotonic()
+
+        def process_frames():
+            nonlocal first_index
+            # Detects the ball in every frame captured since the last call, in order
+            # (if detection falls behind, the grabber drops the oldest frames)
+            latest = None
+            while True:
+                captured = self.grabber.read(timeout=0)
+                if captured is None:
+                    break
+
+                frame_index, timestamp, frame = captured
+                if first_index is None:
+                    first_index = frame_index
+
+                # Loop over the balls found in the frame
+                balls = self.find_ball(frame)
+                self.add_balls(frame_index - first_index, timestamp - start_time, balls)
+                for centre, _, _, _ in balls:
+                    self.trail.add(centre, frame.shape)
+                self.update_estimator(balls)
+                latest = frame, balls
+
+            # The display runs at its own, lower rate, so most frames are never drawn on
+            if latest is not None and display.is_due():
+                frame, balls = latest
+                self.draw_detections(frame, balls)
+                self.show_prediction(frame)
+                display.show(frame)
 
             # Check if video feed has ended
-            if not ret:
+            if self.grabber.ended:
                 print("Video feed ended")
-                break
-
-            # Convert the frame to HSV colour space
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-            # Threshold the HSV image to get only ball colours
-            mask = cv2.inRange(hsv, lower_bound, upper_bound)
+                on_done()
+                return
 
-            # Perform a series of morphological operations to remove noise and close gaps in the mask
-            kernel = np.ones((5, 5), np.uint8)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+            root.after(self.webcam_poll_delay, process_frames)
 
-            # Find contours in the mask
-            cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+        root.after(0, process_frames)
+        root.mainloop()
 
-            # Loop over the contours
-            for c in cnts:
-                # Compute the minimum enclosing circle and centroid for the contour
-                ((x, y), radius) = cv2.minEnclosingCircle(c)
-                M = cv2.moments(c)
-                centre = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
-
-                # Only proceed if the radius is large enough
-                if radius > 10:
-                    self.__centroid_coords.append(centre)
-                    self.__radius_values.append(radius)
-
-                    # Draw the circle and centroid on the frame
-                    cv2.circle(frame, (int(x), int(y)), int(radius), (255, 0, 0), 2)
-                    cv2.circle(frame, centre, 8, (0, 0, 255), cv2.FILLED)
-
-                self.show_centroids(frame, self.__centroid_coords)
-
-            # Show the frame on the Tkinter canvas
-            if frame is not None:
-                img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(img)
-                imgTk = ImageTk.PhotoImage(image=img)
-                canvas.create_image(0, 0, anchor="nw", image=imgTk)
-                root.update()
+        print(f'Captured {self.grabber.captured_frames} frames, dropped {self.grabber.dropped_frames} '
+              f'(longest queue: {self.grabber.max_queue_depth} frames).')
 
     def detect_ball_vid(self):
-        # Define the range of colour for the ball in HSV space
-        lower_bound = np.array([29, 86, 6])
-        upper_bound = np.array([64, 255, 255])
-
+        # The preview renders on its own thread, so detection runs at decode speed
+        preview = None
+        if self.display and self.preview_fps is not None:
+            preview = FramePreview("Video Feed", self.preview_fps)
         # Set the window properties
-        cv2.namedWindow("Video Feed", cv2.WINDOW_NORMAL)
+        elif self.display:
+            cv2.namedWindow("Video Feed", cv2.WINDOW_NORMAL)
+            window_sized = False
 
+        frame_index = 0
         while True:
             # Read a frame from the webcam
-            ret, frame = self.video_path.read()
+            with stage('decode'):
+                ret, frame = self.video_path.read()
+            # Time of the frame in seconds, as reported by the video file
+            timestamp = self.video_path.get(cv2.CAP_PROP_POS_MSEC) / 1000
             
             # Check if video feed has ended
             if not ret:
-                print("Video feed ended")
+                if self.display:
+                    print("Video feed ended")
                 break
+            count('frames')
 
-            # Get the original size of the frame
-            height, width, _ = frame.shape
+            # Stops early if a key was pressed in the preview window
+            if preview is not None and preview.stopped:
+                break
 
-            # Calculate the aspect ratio of the frame
-            aspect_ratio = width / height
+            # Loop over the balls found in the frame
+            balls = self.find_ball(frame)
+            self.add_balls(frame_index, timestamp, balls)
+            frame_index += 1
+            if self.display:
+                for centre, _, _, _ in balls:
+                    self.trail.add(centre, frame.shape)
 
-            # Resize the window to match the aspect ratio of the frame
-            cv2.resizeWindow("Video Feed", int(600 * aspect_ratio), 600)
+            if preview is not None:
+                # Drawing happens on the preview thread, and only for frames that are actually shown
+                preview.submit(frame, lambda img, balls=balls: self.draw_detections(img, balls))
+                continue
 
-            # Convert the frame to HSV colour space
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            if not self.display:
+                continue
 
-            # Threshold the HSV image to get only ball colours
-            mask = cv2.inRange(hsv, lower_bound, upper_bound)
+            if not window_sized:
+                # Get the original size of the frame
+                height, width, _ = frame.shape
 
-            # Perform a series of morphological operations to remove noise and close gaps in the mask
-            kernel = np.ones((5, 5), np.uint8)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+                # Calculate the aspect ratio of the frame
+                aspect_ratio = width / height
+
+                # Resize the window to match the aspect ratio of the frame
+                cv2.resizeWindow("Video Feed", int(600 * aspect_ratio), 600)
+                window_sized = True
+
+            self.draw_detections(frame, balls)
 
-            # Find contours in the mask
-            cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = cnts[0] if len(cnts) == 2 else cnts[1]
-            
-            # Loop over the contours
-            for c in cnts:
-                # Compute the minimum enclosing circle and centroid for the contour
-                ((x, y), radius) = cv2.minEnclosingCircle(c)
-                M = cv2.moments(c)
-                centre = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
-                
-                # Only proceed if the radius is large enough
-                if radius > 10:
-                    self.__centroid_coords.append(centre)
-                    self.__radius_values.append(radius)
-                    
-                    # Draw the circle and centroid on the frame
-                    cv2.circle(frame, (int(x), int(y)), int(radius), (255, 0, 0), 2)
-                    cv2.circle(frame, centre, 8, (0, 0, 255), cv2.FILLED)
-
-                self.show_centroids(frame, self.__centroid_coords)
-            
             # Show the frame
             try:
                 if frame is not None:
-                    cv2.imshow("Video Feed", frame)
-                    cv2.waitKey(100)
+                    with stage('display'):
+                        cv2.imshow("Video Feed", frame)
+                    cv2.waitKey(self.frame_delay)
             except:
                 print('No video feed detected.')
 
+        # Release the video file once every frame has been read
+        self.video_path.release()
+
         # Destroys all windows
-        cv2.destroyAllWindows()
+        if preview is not None:
+            preview.close()
+        elif self.display:
+            cv2.destroyAllWindows()
+
+    def detect_ball_vid_pipelined(self, workers=None, chunk_size=8):
+        if workers is None:
+            workers = os.cpu_count()
+
+        # Bounded queue so the decoder cannot run too far ahead of the detection workers
+        frame_chunks = queue.Queue(maxsize=workers * 2)
+        # Set if detection fails, so the decoder stops instead of waiting for room in the queue forever
+        stopped = threading.Event()
+
+        def decode_frames():
+            # Decodes frames on its own thread and hands them over in chunks
+            chunk = []
+            frame_index = 0
+            while not stopped.is_set():
+                with stage('decode'):
+                    ret, frame = self.video_path.read()
+                if not ret:
+                    break
+                count('frames')
+                timestamp = self.video_path.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                chunk.append((frame_index, timestamp, frame))
+                frame_index += 1
+                if len(chunk) == chunk_size:
+                    frame_chunks.put(chunk)
+                    chunk = []
+            if len(chunk) > 0:
+                frame_chunks.put(chunk)
+            # Tells the collector that there are no frames left
+            frame_chunks.put(None)
+
+        def detect_chunk(chunk):
+            # Runs the mask-and-contour stage on every frame in the chunk
+            return [(frame_index, timestamp, find_ball(frame, self.profile))
+                    for frame_index, timestamp, frame in chunk]
+
+        def collect(future):
+            # Stores the detections of a finished chunk in frame order
+            for frame_index, timestamp, balls in future.result():
+                self.__detections.add_balls(frame_index, timestamp, balls)
+
+        decoder = threading.Thread(target=decode_frames, daemon=True)
+        decoder.start()
+
+        try:
+            # OpenCV releases the GIL while it works, so threads are enough to keep every core busy
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Chunks are collected in the order they were submitted, regardless of which finishes first
+                pending = deque()
+                while True:
+                    chunk = frame_chunks.get()
+                    if chunk is None:
+                        break
+                    pending.append(pool.submit(detect_chunk, chunk))
+                    # Keeps a limited number of chunks in flight
+                    while len(pending) > workers:
+                        collect(pending.popleft())
+                while len(pending) > 0:
+                    collect(pending.popleft())
+        finally:
+            # If detection failed, the decoder may be waiting for room in the queue, so it is emptied
+            # until the decoder has seen the stop flag and finished
+            stopped.set()
+            while decoder.is_alive():
+                try:
+                    frame_chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            decoder.join()
+
+            # Release the video file once every frame has been read (or detection has failed)
+            self.video_path.release()
 
-    def show_centroids(self, frame, centroids):
+    def find_ball(self, frame):
+        # Searches only around the tracked ball when tracking, otherwise the whole frame
+        if self.tracker is not None:
+            return self.tracker.find_ball(frame, self.profile)
+
+        return find_ball(frame, self.profile)
+
+    def update_estimator(self, balls):
+        # Adds the tracked ball to the live fit, starting a new fit whenever a different ball is followed
+        # (with tracking on, the balls passed in are already at most the one tracked ball)
+        tracks_started = self.estimator_tracker.tracks_started
+        tracked = self.estimator_tracker.update(balls)
+        if self.estimator_tracker.tracks_started != tracks_started:
+            self.estimator = OnlineProjectileEstimator(ball_diameter=self.estimator.ball_diameter)
+
+        # The ball's position in the frame before the track started is the launch point
+        start = self.estimator_tracker.take_track_start()
+        for centre, _, radius, _ in ([start] if start is not None else []) + tracked:
+            self.estimator.update(centre, radius)
+
+    def add_balls(self, frame_index, timestamp, balls):
+        # Records the balls found in a frame searched by find_ball
+        # The tracker only starts a track once the ball has moved, so the ball's position in the frame
+        # before (such as the moment of launch) is recorded then
+        if self.tracker is not None:
+            start = self.tracker.take_track_start()
+            if start is not None and self.__previous_frame is not None:
+                self.__detections.add_balls(*self.__previous_frame, [start])
+            self.__previous_frame = frame_index, timestamp
+
+        self.__detections.add_balls(frame_index, timestamp, balls)
+
+    def draw_detections(self, frame, balls):
+        with stage('draw'):
+            for centre, (x, y), radius, _ in balls:
+                # Draw the circle and centroid on the frame
+                cv2.circle(frame, (int(x), int(y)), int(radius), (255, 0, 0), 2)
+                cv2.circle(frame, (int(centre[0]), int(centre[1])), 8, (0, 0, 255), cv2.FILLED)
+
+            self.show_centroids(frame)
+
+    def show_prediction(self, frame):
+        # Draw the predicted path and landing point from the live trajectory fit
+        with stage('draw'):
+            self.draw_prediction(frame)
+
+    def draw_prediction(self, frame):
+        path = self.estimator.get_predicted_path()
+        if path is None:
+            return
+
+        cv2.polylines(frame, [path], False, (255, 0, 255), 2)
+        landing_point = self.estimator.get_predicted_landing_point()
+        cv2.drawMarker(frame, landing_point, (255, 0, 255), cv2.MARKER_CROSS, 20, 2)
+
+        predicted_range = self.estimator.get_predicted_range()
+        if predicted_range is not None:
+            cv2.putText(frame, f'Predicted range: {predicted_range:.2f} m', (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 255), 2)
+
+    def show_centroids(self, frame):
         # Draw accumulated centroids on current frame
-        trace_colour = 255
-        for i in centroids:
-            cv2.circle(frame, (i[0], i[1]), 6, (0, trace_colour, 0), cv2.FILLED)
-            if trace_colour < 100:
-                trace_colour = 255
-            trace_colour -= 1
+        # The trail already holds every centroid, so this costs the same however many have been detected
+        self.trail.apply(frame)
+
+
+class CentroidTrail:
+    # Persistent overlay layer holding every centroid detected so far
+    # Each centroid is drawn onto the layer once, so applying the trail to a frame takes
+    # the same time no matter how long the trail is
+    def __init__(self, alpha=1.0, radius=6):
+        # Opacity of the trail when it is blended onto a frame
+        self.alpha = alpha
+        self.radius = radius
+
+        # Private attributes
+        self.__layer = None
+        self.__mask = None
+        self.__trace_colour = 255
+
+    def add(self, centre, frame_shape):
+        # (Re)allocates the layer if this is the first centroid or the frame size has changed
+        if self.__layer is None or self.__layer.shape != frame_shape:
+            self.__layer = np.zeros(frame_shape, np.uint8)
+            self.__mask = np.zeros(frame_shape[:2], np.uint8)
+
+        # Draws only the new centroid onto the layer and marks the pixels it covers
+        # (centroids from downscaled detection are sub-pixel, so they are truncated like the others)
+        centre = (int(centre[0]), int(centre[1]))
+        cv2.circle(self.__layer, centre, self.radius, (0, self.__trace_colour, 0), cv2.FILLED)
+        cv2.circle(self.__mask, centre, self.radius, 255, cv2.FILLED)
+
+        # Older centroids fade from bright to dark green, starting again from bright after 155 centroids
+        if self.__trace_colour < 100:
+            self.__trace_colour = 255
+        self.__trace_colour -= 1
+
+    def apply(self, frame):
+        # Puts the trail onto the frame in place
+        if self.__layer is None or self.__layer.shape != frame.shape:
+            return
+
+        if self.alpha >= 1:
+            # Copies the trail pixels straight onto the frame
+            cv2.copyTo(self.__layer, self.__mask, frame)
+        else:
+            # Blends the trail with the frame, leaving pixels outside the trail untouched
+            blended = cv2.addWeighted(frame, 1 - self.alpha, self.__layer, self.alpha, 0)
+            cv2.copyTo(blended, self.__mask, frame)
+
+
+class FrameGrabber:
+    # Reads frames from a capture device on its own thread into a small ring buffer, so the camera is
+    # never kept waiting by slow detection or rendering
+    # When the buffer is full the oldest frame is overwritten, so consumers always get recent frames
+    def __init__(self, capture, capacity=4, flip=False):
+        self.capture = capture
+        self.capacity = capacity
+        # Mirrors every frame horizontally, as for a webcam facing the user
+        self.flip = flip
+
+        # Counters for how well the consumers are keeping up
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.max_queue_depth = 0
+        # Set once the capture has stopped producing frames
+        self.ended = False
+
+        # Private attributes
+        self.__frames = deque(maxlen=capacity)
+        self.__condition = threading.Condition()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__capture_loop, daemon=True)
+        self.__thread.start()
+
+    def read(self, timeout=None):
+        # Returns the oldest buffered (frame index, timestamp, frame), waiting up to timeout seconds
+        # for one to arrive, or None if there is no frame (check ended to tell a timeout from the end)
+        with self.__condition:
+            self.__condition.wait_for(lambda: len(self.__frames) > 0 or self.ended, timeout)
+            if len(self.__frames) == 0:
+                return None
+            return self.__frames.popleft()
+
+    def read_latest(self, timeout=None):
+        # Returns the newest buffered frame, discarding any older ones, for consumers that only display
+        with self.__condition:
+            self.__condition.wait_for(lambda: len(self.__frames) > 0 or self.ended, timeout)
+            if len(self.__frames) == 0:
+                return None
+            latest = self.__frames.pop()
+            self.__frames.clear()
+            return latest
+
+    def clear(self):
+        # Discards every buffered frame
+        with self.__condition:
+            self.__frames.clear()
+
+    def get_queue_depth(self):
+        # Number of frames waiting to be read
+        return len(self.__frames)
+
+    def stop(self):
+        # Stops capturing and releases the capture device
+        self.__running = False
+        self.__thread.join()
+        self.capture.release()
+
+    def __capture_loop(self):
+        frame_index = 0
+        while self.__running:
+            with stage('decode'):
+                ret, frame = self.capture.read()
+            timestamp = time.monotonic()
+            if not ret:
+                break
+            count('frames')
+            if self.flip:
+                frame = cv2.flip(frame, 1)
+
+            with self.__condition:
+                if len(self.__frames) == self.capacity:
+                    # The deque drops the oldest frame to make room
+                    self.dropped_frames += 1
+                    count('dropped_frames')
+                self.__frames.append((frame_index, timestamp, frame))
+                self.captured_frames += 1
+                self.max_queue_depth = max(self.max_queue_depth, len(self.__frames))
+                self.__condition.notify()
+            frame_index += 1
+
+        with self.__condition:
+            self.ended = True
+            self.__condition.notify_all()
+
+
+class TkFrameDisplay:
+    # Shows frames on a Tkinter canvas through a single image item whose pixels are replaced in place,
+    # instead of adding a new canvas item and PhotoImage for every frame
+    # Frames are shown at no more than max_fps times a second, however fast they are produced
+    def __init__(self, canvas, max_fps=15, size=None):
+        self.canvas = canvas
+        self.interval = 1 / max_fps
+        # (width, height) to resize frames to, or None to show them at their own size
+        self.size = size
+
+        # Private attributes
+        self.__photo = None
+        self.__item = None
+        self.__last_shown = 0
+
+    def is_due(self):
+        # True once enough time has passed since the last frame was shown
+        return time.monotonic() - self.__last_shown >= self.interval
+
+    def get_delay(self):
+        # Milliseconds until the next frame is due
+        remaining = self.interval - (time.monotonic() - self.__last_shown)
+        return max(1, int(remaining * 1000))
+
+    def show(self, frame):
+        # Shows a BGR frame, unless the previous one was shown too recently
+        if not self.is_due():
+            return False
+        self.__last_shown = time.monotonic()
+        with stage('display'):
+            self.__show(frame)
+        return True
+
+    def __show(self, frame):
+        from PIL import Image, ImageTk
+
+        if self.size is not None:
+            frame = cv2.resize(frame, self.size)
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        if self.__photo is None or (self.__photo.width(), self.__photo.height()) != image.size:
+            # The first frame (or one of a new size) creates the image item
+            self.__photo = ImageTk.PhotoImage(image=image)
+            if self.__item is None:
+                self.__item = self.canvas.create_image(0, 0, anchor='nw', image=self.__photo)
+            else:
+                self.canvas.itemconfig(self.__item, image=self.__photo)
+        else:
+            # Every other frame only replaces the pixels of the existing image
+            self.__photo.paste(image)
+
+
+class FramePreview:
+    # Shows the most recent frame in an OpenCV window on its own thread, at most max_fps times a second,
+    # so that rendering never slows down detection
+    def __init__(self, window_name, max_fps=10):
+        self.window_name = window_name
+        self.interval = 1 / max_fps
+        # Set once a key has been pressed in the preview window
+        self.stopped = False
+
+        # Private attributes
+        self.__lock = threading.Lock()
+        self.__latest = None
+        self.__last_submitted = 0
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__render_loop, daemon=True)
+        self.__thread.start()
+
+    def submit(self, frame, overlay=None):
+        # Never blocks: frames arriving faster than the preview rate are simply skipped
+        now = time.monotonic()
+        if now - self.__last_submitted < self.interval:
+            return
+        self.__last_submitted = now
+
+        # Only the newest frame is kept, replacing any frame that has not been shown yet
+        with self.__lock:
+            self.__latest = (frame, overlay)
+
+    def close(self):
+        self.__running = False
+        self.__thread.join()
+
+    def __render_loop(self):
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        window_sized = False
+
+        while self.__running:
+            with self.__lock:
+                latest = self.__latest
+                self.__latest = None
+
+            if latest is not None:
+                frame, overlay = latest
+                if overlay is not None:
+                    overlay(frame)
+
+                if not window_sized:
+                    # Resize the window to match the aspect ratio of the frame
+                    height, width, _ = frame.shape
+                    cv2.resizeWindow(self.window_name, int(600 * width / height), 600)
+                    window_sized = True
+
+                with stage('display'):
+                    cv2.imshow(self.window_name, frame)
+
+            # Waiting for a key press also paces the preview
+            if cv2.waitKey(max(1, int(self.interval * 1000))) != -1:
+                self.stopped = True
+
+        cv2.destroyWindow(self.window_name)
+
+
+class BallDetections:
+    # Stands in for Video when centroid and radius values are already known,
+    # e.g. when they were recorded earlier, come from another process or are one track of several
+    def __init__(self, centroid_coords, radius_values, timestamps=None):
+        # Private attributes
+        self.__centroid_coords = np.asarray(centroid_coords, dtype=np.float64).reshape(-1, 2)
+        self.__radius_values = np.asarray(radius_values, dtype=np.float64)
+        self.__timestamps = None if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+
+    def get_radius_values(self):
+        # Getter method for retrieving the array of radius values
+        if len(self.__radius_values) == 0:
+            raise ValueError('No projectile detected.')
+
+        return self.__radius_values
+
+    def get_centroid_coords(self):
+        # Getter method for retrieving the (n, 2) array of centroid values
+        return self.__centroid_coords
 
+    def get_timestamps(self):
+        # Getter method for retrieving the time of every detection, or None if they are not known
+        return self.__timestamps